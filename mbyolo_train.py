@@ -17,6 +17,8 @@ def parse_opt():
     parser.add_argument('--epochs', type=int, default=300)
     parser.add_argument('--optimizer', default='SGD', help='SGD, Adam, AdamW')
     parser.add_argument('--amp', action='store_true', help='open amp')
+    parser.add_argument('--use_checkpoint', action='store_true', help='recompute Mamba block activations in backward')
+    parser.add_argument('--ssm_precision', default=None, help='selective scan precision under amp, fp32 or mixed')
     parser.add_argument('--project', default=ROOT + '/output_dir/mscoco', help='save to project/name')
     parser.add_argument('--name', default='mambayolo', help='save to project/name')
     parser.add_argument('--half', action='store_true', help='use FP16 half-precision inference')
@@ -36,6 +38,8 @@ if __name__ == '__main__':
         "optimizer": opt.optimizer,
         "device": opt.device,
         "amp": opt.amp,
+        "use_checkpoint": opt.use_checkpoint,
+        "ssm_precision": opt.ssm_precision,
         "project": ROOT + opt.project,
         "name": opt.name,
     }
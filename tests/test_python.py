@@ -1,6 +1,7 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
 import contextlib
+import time
 import urllib
 from copy import copy
 from pathlib import Path
@@ -66,6 +67,105 @@ def test_model_profile():
     _ = model.predict(im, profile=True)
 
 
+def test_model_augment():
+    """Test that batched and concurrent augmented inference matches one forward per augmented image."""
+    from ultralytics.nn.tasks import DetectionModel
+
+    model = DetectionModel(verbose=False).eval()
+    x = torch.rand(2, 3, 96, 64)
+    xs = [x, x.flip(3), torch.rand(1, 3, 64, 64)]  # two inputs share a shape and are batched
+    with torch.inference_mode():
+        y = model._predict_batched(xs)
+        for yi, xi in zip(y, xs):
+            assert torch.allclose(yi, model.predict(xi)[0], atol=1e-5)
+        y = model.predict(x, augment=True)[0]
+    assert y.shape[0] == 2 and not y.requires_grad
+
+
+def test_model_ensemble():
+    """Test concurrent ensemble inference and weighted box fusion of member predictions."""
+    from ultralytics.nn.tasks import DetectionModel, Ensemble
+    from ultralytics.utils.ops import non_max_suppression, weighted_boxes_fusion
+
+    a = torch.tensor([[0, 0, 10, 10, 0.9, 0], [50, 50, 60, 60, 0.8, 1]])
+    b = torch.tensor([[1, 1, 11, 11, 0.7, 0], [0, 0, 10, 10, 0.6, 1]])
+    fused = weighted_boxes_fusion([a, b], weights=[3, 1])
+    d = 0.7 / (3 * 0.9 + 0.7)  # confidence and model weighted offset of the second box
+    assert torch.allclose(fused[0], torch.tensor([d, d, 10 + d, 10 + d, (3 * 0.9 + 0.7) / 4, 0]))
+    assert torch.allclose(fused[1:, 4], torch.tensor([0.6, 0.15]))  # found by one model only, down-weighted
+
+    models = [DetectionModel(verbose=False).eval() for _ in range(2)]
+    x = torch.rand(2, 3, 64, 64)
+    ensemble, concurrent = Ensemble(), Ensemble(concurrent=True)
+    ensemble.extend(models)
+    concurrent.extend(models)
+    with torch.inference_mode():
+        assert torch.equal(concurrent(x)[0], ensemble(x)[0])
+        wbf = Ensemble(fusion="wbf", conf=0.0)
+        wbf.extend([models[0], models[0]])  # identical members, fusion keeps the member detections
+        y = non_max_suppression(wbf(x)[0], 0.0, 0.99)
+        for yi, ref in zip(y, non_max_suppression(models[0](x)[0], 0.0, wbf.iou)):
+            assert torch.allclose(yi, ref[ref[:, 4].argsort(descending=True)], atol=1e-4)
+
+
+@pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
+def test_model_ensemble_load():
+    """Test loading weighted box fusion ensembles with attempt_load_weights and AutoBackend."""
+    from ultralytics.nn.autobackend import AutoBackend
+    from ultralytics.nn.tasks import DetectionModel, Ensemble, attempt_load_weights
+    from ultralytics.utils.weights import save_weights
+
+    files = [save_weights(DetectionModel(nc=3, verbose=False), TMP / f"member{i}.safetensors") for i in range(2)]
+    model = attempt_load_weights(files, concurrent=True, fusion="wbf", fusion_weights=[2, 1])
+    assert isinstance(model, Ensemble) and model.concurrent and model.fusion_weights == [2, 1]
+    backend = AutoBackend(files, fuse=False, ensemble={"fusion": "wbf", "fusion_weights": [2, 1]})
+    assert backend.model.fusion == "wbf"
+    with torch.no_grad():
+        assert backend(torch.rand(1, 3, 64, 64))[0].shape[:2] == (1, 7)  # fused (B, 4 + nc, N) predictions
+
+
+def test_model_from_weights():
+    """Test building a model on the meta device straight from weights, and the fallback for partial weights."""
+    from ultralytics.nn.tasks import DetectionModel
+
+    weights = DetectionModel(nc=3, verbose=False)
+    model = DetectionModel.from_weights(weights, nc=3, verbose=False)
+    assert not any(t.is_meta for t in [*model.parameters(), *model.buffers(), model.stride, model.model[-1].anchors])
+    assert torch.equal(model.stride, weights.stride) and model.model[-1].stride is model.stride
+    x = torch.rand(1, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.equal(model.eval()(x)[0], weights.eval()(x)[0])
+    model = DetectionModel.from_weights(weights, nc=5, verbose=False)  # head differs, built and transferred as before
+    assert model.model[-1].nc == 5 and torch.equal(model.model[0].conv.weight, weights.model[0].conv.weight)
+
+
+@pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
+def test_model_safetensors():
+    """Test saving memory-mapped weights and loading them with attempt_load_weights and AutoBackend."""
+    from ultralytics.nn.autobackend import AutoBackend
+    from ultralytics.nn.tasks import ClassificationModel, DetectionModel, attempt_load_weights
+    from ultralytics.utils.weights import load_weights, save_weights
+
+    model = DetectionModel(nc=3, verbose=False).eval()
+    file = save_weights(model, TMP / "weights.safetensors", train_args={"imgsz": 64})
+    loaded = attempt_load_weights(file)
+    assert loaded.args["imgsz"] == 64 and loaded.names == model.names and torch.equal(loaded.stride, model.stride)
+    assert loaded.nc == 3
+    x = torch.rand(1, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.equal(AutoBackend(file, fuse=False)(x)[0], model(x)[0])
+    with pytest.raises(ValueError):
+        save_weights(model.fuse(verbose=False), TMP / "fused.safetensors")
+    with pytest.raises(ValueError):
+        save_weights(torch.nn.Linear(2, 2), TMP / "torchvision.safetensors")  # no YAML, e.g. torchvision models
+
+    model = ClassificationModel("yolov8n-cls.yaml", nc=1000, verbose=False)
+    ClassificationModel.reshape_outputs(model, 10)  # fine-tuning a pretrained classifier on 10 classes
+    model.nc, model.names = 10, {i: str(i) for i in range(10)}
+    loaded = load_weights(save_weights(model, TMP / "classify.safetensors"))["model"]
+    assert loaded.nc == 10 and torch.equal(loaded.model[-1].linear.weight, model.model[-1].linear.weight)
+
+
 @pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
 def test_predict_txt():
     """Test YOLO predictions with sources (file, dir, glob, recursive glob) specified in a text file."""
@@ -361,6 +461,21 @@ def test_utils_benchmarks():
     ProfileModels(["yolov8n.yaml"], imgsz=32, min_time=1, num_timed_runs=3, num_warmup_runs=1).profile()
 
 
+def test_utils_benchmarks_selective_scan():
+    """Test the selective scan benchmark suite, saving a baseline and flagging regressions against it."""
+    from ultralytics.utils.benchmarks import ProfileSelectiveScan
+
+    kwargs = dict(channels=(8,), d_state=(4,), imgsz=(4,), num_timed_runs=2, num_warmup_runs=1, device="cpu")
+    TMP.mkdir(parents=True, exist_ok=True)
+    baseline = TMP / "selective_scan.json"
+    bench = ProfileSelectiveScan(save=baseline, **kwargs)
+    results = bench.profile()
+    assert len(results) == 2 * len(bench.TARGETS) * len(bench.backends) and all("latency_ms" in r for r in results)
+    assert all(r["peak_memory_mb"] > 0 for r in results)  # measured on CPU too
+    results = ProfileSelectiveScan(baseline=baseline, threshold=-1, **kwargs).profile()  # any latency is a regression
+    assert all(r["regression"] for r in results)
+
+
 def test_utils_torchutils():
     """Test Torch utility functions."""
     from ultralytics.nn.modules.conv import Conv
@@ -374,6 +489,137 @@ def test_utils_torchutils():
     time_sync()
 
 
+@pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
+def test_utils_torchutils_model_info_for_loggers(monkeypatch):
+    """Test that logger profiling waits for the checkpoint written in the background."""
+    from types import SimpleNamespace
+
+    from ultralytics.utils import benchmarks
+    from ultralytics.utils.torch_utils import CheckpointWriter, model_info_for_loggers
+
+    last = TMP / "last_profile.pt"
+    last.unlink(missing_ok=True)
+    profiled = []
+
+    class ProfileModels:
+        def __init__(self, paths, device=None):
+            profiled.append(all(p.exists() for p in paths))
+
+        def profile(self):
+            return [{"model/name": "last_profile"}]
+
+    monkeypatch.setattr(benchmarks, "ProfileModels", ProfileModels)
+    trainer = SimpleNamespace(
+        args=SimpleNamespace(profile=True),
+        last=last,
+        device="cpu",
+        checkpoint_writer=CheckpointWriter(),
+        validator=SimpleNamespace(speed={"inference": 1.0}),
+    )
+    trainer.checkpoint_writer.save({}, lambda ckpt: time.sleep(0.2) or last.write_bytes(b"ckpt"))
+    assert model_info_for_loggers(trainer) == {"model/speed_PyTorch(ms)": 1.0} and profiled == [True]
+
+
+def test_data_device_prefetcher():
+    """Test that DevicePrefetcher yields every batch in order, moved to the device and transformed."""
+    from ultralytics.data.build import DevicePrefetcher
+
+    loader = [{"img": torch.full((2, 3, 4, 4), i, dtype=torch.uint8), "im_file": [str(i)] * 2} for i in range(3)]
+    normalize = lambda batch: {**batch, "img": batch["img"].float() / 255}
+    batches = list(DevicePrefetcher(loader, "cpu", normalize))
+    assert len(batches) == len(DevicePrefetcher(loader, "cpu")) == 3
+    assert all(b["img"].dtype == torch.float32 and b["img"].max() == i / 255 for i, b in enumerate(batches))
+    encode = lambda batch: {**batch, "feats": normalize(batch)["img"].flatten(1) @ torch.ones(48, 2)}  # model-like
+    autocast = lambda: torch.autocast("cpu", dtype=torch.bfloat16)
+    assert all(b["feats"].dtype == torch.bfloat16 for b in DevicePrefetcher(loader, "cpu", encode, autocast))
+
+
+def test_utils_telemetry():
+    """Test StepTelemetry phase times, with nested phases excluded from the enclosing one."""
+    from ultralytics.utils.telemetry import StepTelemetry
+
+    telemetry = StepTelemetry("cpu", window=2)
+    for _ in telemetry.iterate(range(3)):
+        with telemetry.time("optimizer"):
+            time.sleep(0.002)
+            with telemetry.time("ema"):
+                time.sleep(0.01)
+        telemetry.step()
+    times = telemetry.summary()
+    assert telemetry.steps == 3 and len(telemetry.window) == 2 and set(times) >= {"time/data", "time/step"}
+    assert 1 < times["time/optimizer"] < times["time/ema"] < times["time/step"]
+
+
+def test_utils_torchutils_ema():
+    """Test the foreach ModelEMA update against the per-tensor reference, and updates every n steps."""
+    from ultralytics.utils.torch_utils import ModelEMA
+
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3), torch.nn.BatchNorm2d(8))
+    ema, ema2 = ModelEMA(model), ModelEMA(model, interval=2)
+    ref = {k: v.clone() for k, v in ema.ema.state_dict().items()}
+    w0 = ref["0.weight"].clone()
+    for i in range(1, 5):
+        with torch.no_grad():
+            for p in model.parameters():
+                p += torch.randn_like(p)
+        ema.update(model)
+        ema2.update(model)
+        d, msd = ema.decay(i), model.state_dict()
+        for k, v in ref.items():
+            if v.dtype.is_floating_point:
+                v *= d
+                v += (1 - d) * msd[k]
+        if i == 1:
+            assert torch.equal(ema2.ema[0].weight, w0)  # first update at step 2
+    assert all(torch.allclose(v, ref[k]) for k, v in ema.ema.state_dict().items())
+    assert ema2.updates == 4 and torch.allclose(ema2.ema[0].weight, ema.ema[0].weight, atol=0.05)
+
+
+def test_utils_torchutils_checkpoint_writer():
+    """Test that CheckpointWriter writes snapshots unaffected by later training updates, and re-raises write errors."""
+    from ultralytics.utils.torch_utils import CheckpointWriter
+
+    model, written = torch.nn.Linear(2, 2), []
+    weight = model.weight.detach().clone()
+    write = lambda ckpt: written.append((ckpt["epoch"], ckpt["model"].weight.clone(), ckpt["state"][0]["t"].clone()))
+    writer = CheckpointWriter()
+    writer.save({"model": model, "epoch": 1, "state": [{"t": torch.ones(2)}]}, write)
+    with torch.no_grad():
+        model.weight += 1  # training continues while the checkpoint is written
+    writer.save({"model": model, "epoch": 2, "state": [{"t": torch.zeros(2)}]}, write)
+    writer.wait()
+    assert [c[0] for c in written] == [1, 2] and torch.equal(written[0][1], weight)
+    assert torch.equal(written[1][1], model.weight) and torch.equal(written[0][2], torch.ones(2))
+    writer.save({}, lambda ckpt: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        writer.wait()
+
+
+@pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
+def test_trainer_write_checkpoint():
+    """Test that safetensors weights are written for last and best checkpoints only, not for epoch checkpoints."""
+    from ultralytics.models.yolo.detect import DetectionTrainer
+    from ultralytics.nn.tasks import DetectionModel
+    from ultralytics.utils import IterableSimpleNamespace
+
+    trainer = DetectionTrainer.__new__(DetectionTrainer)  # write_checkpoint needs no dataset or model setup
+    trainer.args, wdir = IterableSimpleNamespace(save_safetensors=True), TMP / "write_checkpoint"
+    trainer.last, trainer.best = wdir / "last.pt", wdir / "best.pt"
+    wdir.mkdir(parents=True, exist_ok=True)
+    model = DetectionModel(nc=3, verbose=False)
+    ckpt = {
+        "epoch": 4,
+        "best_fitness": 0.5,
+        "ema": model,
+        "optimizer": torch.optim.SGD(model.parameters()).state_dict(),
+        "train_args": {},
+        "train_metrics": {"fitness": 0.4},
+        "train_results": "epoch, fitness\n1, 0.5\n",
+    }
+    trainer.write_checkpoint(ckpt, [trainer.last, wdir / "epoch4.pt"])  # save_period without a new best
+    assert {f.name for f in wdir.iterdir()} == {"last.pt", "epoch4.pt", "last.safetensors", "last.yaml"}
+
+
 @pytest.mark.slow
 @pytest.mark.skipif(not ONLINE, reason="environment is offline")
 def test_utils_downloads():
@@ -412,6 +658,48 @@ def test_utils_ops():
     torch.allclose(boxes, xyxyxyxy2xywhr(xywhr2xyxyxyxy(boxes)), rtol=1e-3)
 
 
+def test_utils_loss_preprocess():
+    """Test that packing targets per image matches a loop over the images."""
+    from ultralytics.utils.loss import v8DetectionLoss
+    from ultralytics.utils.ops import xywh2xyxy
+
+    batch_size, scale = 4, torch.tensor([64.0, 32.0, 64.0, 32.0])
+    i = torch.tensor([3, 0, 0, 3, 3, 1, 0], dtype=torch.float32)  # image 2 has no targets
+    targets = torch.cat([i[:, None], torch.rand(len(i), 5)], 1)  # image, class, xywh
+    loss = v8DetectionLoss.__new__(v8DetectionLoss)  # preprocess needs no model
+    out = loss.preprocess(targets, batch_size, scale)
+    assert out.shape == (batch_size, 3, 5)
+    for j in range(batch_size):
+        t = targets[i == j, 1:]
+        assert torch.equal(out[j, : len(t), 0], t[:, 0])
+        assert torch.allclose(out[j, : len(t), 1:], xywh2xyxy(t[:, 1:] * scale))
+        assert not out[j, len(t) :].any()
+    assert loss.preprocess(targets[:0], batch_size, scale).shape == (batch_size, 0, 5)
+
+
+def test_utils_tal_chunk():
+    """Test that the chunked sparse task-aligned assignment matches the dense one."""
+    from ultralytics.utils.tal import TaskAlignedAssigner, make_anchors
+
+    torch.manual_seed(0)
+    anchors, strides = make_anchors([torch.zeros(1, 1, s, s) for s in (16, 8, 4)], [8, 16, 32])
+    anchors = anchors * strides
+    n = torch.tensor([60, 3, 0, 17])  # boxes per image
+    mask_gt = (torch.arange(60) < n[:, None]).float()[..., None]
+    xy, wh = torch.rand(4, 60, 2) * 128, torch.rand(4, 60, 2) * 30 + 20
+    gt_bboxes = torch.cat([xy - wh / 2, xy + wh / 2], -1) * mask_gt
+    gt_labels = torch.randint(0, 5, (4, 60, 1)).float() * mask_gt
+    xy, wh = anchors + torch.randn(4, len(anchors), 2) * 2, torch.rand(4, len(anchors), 2) * 10 + 30
+    pd_bboxes, pd_scores = torch.cat([xy - wh / 2, xy + wh / 2], -1), torch.rand(4, len(anchors), 5)
+
+    args = pd_scores, pd_bboxes, anchors, gt_labels, gt_bboxes, mask_gt
+    dense = TaskAlignedAssigner(topk=10, num_classes=5, alpha=0.5, beta=6.0)(*args)
+    sparse = TaskAlignedAssigner(topk=10, num_classes=5, alpha=0.5, beta=6.0, chunk=16)(*args)
+    for i, (x, y) in enumerate(zip(dense, sparse)):
+        assert torch.allclose(x, y) if i == 2 else torch.equal(x, y)  # target scores up to rounding
+    assert sparse[3].any()
+
+
 def test_utils_files():
     """Test file handling utilities."""
     from ultralytics.utils.files import file_age, file_date, get_latest_run, spaces_in_path
@@ -476,6 +764,322 @@ def test_nn_modules_block():
     BottleneckCSP(c1, c2)(x)
 
 
+def test_nn_modules_selective_scan_torch():
+    """Test the PyTorch selective scan against a sequential reference recurrence, forward and backward."""
+    from ultralytics.nn.modules.common_utils_mbyolo import SelectiveScanTorch
+
+    def selective_scan_ref(u, delta, A, B, C, D, delta_bias):
+        delta = torch.nn.functional.softplus(delta + delta_bias[:, None])
+        B, C = (t.repeat_interleave(u.shape[1] // t.shape[1], dim=1) for t in (B, C))  # (b, k * d, n, l)
+        h, ys = u.new_zeros((*u.shape[:2], A.shape[1])), []
+        for i in range(u.shape[-1]):
+            h = torch.exp(delta[..., i, None] * A) * h + delta[..., i, None] * B[..., i] * u[..., i, None]
+            ys.append((h * C[..., i]).sum(-1))
+        return torch.stack(ys, dim=-1) + D[:, None] * u
+
+    b, k, d, n, l = 2, 4, 8, 16, 75  # batch, directions, channels, state, sequence length
+    inputs = [
+        torch.randn(b, k * d, l),
+        torch.randn(b, k * d, l),
+        -torch.rand(k * d, n) * 4,
+        torch.randn(b, k, n, l),
+        torch.randn(b, k, n, l),
+        torch.randn(k * d),
+        torch.randn(k * d),
+    ]
+    inputs = [x.double().requires_grad_() for x in inputs]
+    y_ref = selective_scan_ref(*inputs)
+    y = SelectiveScanTorch.apply(*inputs, True, 1, 1, True)
+    assert torch.allclose(y, y_ref, atol=1e-4)
+    for g, g_ref in zip(torch.autograd.grad(y.sum(), inputs), torch.autograd.grad(y_ref.sum(), inputs)):
+        assert torch.allclose(g, g_ref, rtol=1e-4, atol=1e-3)
+
+
+def test_nn_modules_selective_scan_backends(monkeypatch):
+    """Test lazy selective scan backend resolution, registration and selection by argument or environment variable."""
+    from ultralytics.nn.modules.common_utils_mbyolo import (
+        SELECTIVE_SCAN_BACKENDS,
+        SelectiveScanTorch,
+        get_selective_scan,
+    )
+    from ultralytics.nn.modules.mamba_yolo import SS2D
+
+    class CountingScan(SelectiveScanTorch):
+        calls = 0
+
+        @staticmethod
+        def forward(ctx, *args):
+            CountingScan.calls += 1
+            return SelectiveScanTorch.forward(ctx, *args)
+
+    monkeypatch.setitem(SELECTIVE_SCAN_BACKENDS, "counting", (CountingScan, None))
+    assert get_selective_scan(None, "cpu") is SelectiveScanTorch
+    assert get_selective_scan("core", "cpu") is SelectiveScanTorch  # compiled kernel can not run on CPU
+    with pytest.raises(ValueError):
+        SS2D(d_model=8, scan_backend="unknown")
+
+    SS2D(d_model=8, scan_backend="counting")(torch.randn(1, 8, 4, 4))
+    assert CountingScan.calls == 1
+    monkeypatch.setenv("SELECTIVE_SCAN_BACKEND", "counting")
+    get_selective_scan.cache_clear()
+    try:
+        assert get_selective_scan(None, "cpu") is CountingScan
+    finally:
+        get_selective_scan.cache_clear()
+
+
+@pytest.mark.parametrize("mode", ["cross", "bidi", "unidi", "snake"])
+def test_nn_modules_cross_selective_scan(mode):
+    """Test that the copy-free cross selective scan matches the kernel path in every scan mode, forward and backward."""
+    from ultralytics.nn.modules.common_utils_mbyolo import (
+        SCAN_MODES,
+        SelectiveScanTorch,
+        cross_scan_index,
+        cross_selective_scan,
+        cross_selective_scan_kernel,
+    )
+
+    def selective_scan(u, delta, A, B, C, D=None, delta_bias=None, delta_softplus=True):
+        return SelectiveScanTorch.apply(u, delta, A, B, C, D, delta_bias, delta_softplus, 1, 1, True)
+
+    b, d, h, w, n, r, k = 2, 8, 7, 9, 4, 3, SCAN_MODES[mode]  # batch, channels, height, width, state, dt rank, dirs
+    index = cross_scan_index(h, w, mode=mode)
+    assert (index.sort(dim=1).values == torch.arange(h * w)).all()  # every direction visits each position once
+    inputs = [
+        torch.randn(b, d, h, w),
+        torch.randn(k, r + 2 * n, d) * 0.3,
+        torch.randn(k, d, r) * 0.3,
+        torch.randn(k, d) * 0.3,
+        torch.randn(k * d, n) * 0.5,
+        torch.randn(k * d),
+    ]
+    inputs = [x.requires_grad_() for x in inputs]
+    x, x_proj_weight, dt_projs_weight, dt_projs_bias, A_logs, Ds = inputs
+    y = cross_selective_scan(
+        x, x_proj_weight, None, dt_projs_weight, dt_projs_bias, A_logs, Ds, out_norm=torch.nn.Identity(),
+        SelectiveScan=SelectiveScanTorch, scan_mode_type=mode,
+    )
+    y_ref = cross_selective_scan_kernel(
+        x, x_proj_weight, None, dt_projs_weight, dt_projs_bias, -A_logs.exp(), Ds, True, False, selective_scan,
+        None if mode == "cross" else index,  # CrossScan/CrossMerge for the default mode
+    )
+    y_ref = y_ref.transpose(1, 2).reshape(b, h, w, d)
+    assert torch.allclose(y, y_ref, atol=1e-5)
+    weight = torch.randn_like(y)  # non-uniform output gradient
+    grads, grads_ref = (torch.autograd.grad((t * weight).sum(), inputs) for t in (y, y_ref))
+    for g, g_ref in zip(grads, grads_ref):
+        assert torch.allclose(g, g_ref, atol=1e-4)
+
+
+def test_nn_modules_ss2d_window():
+    """Test that windowed SS2D scans tiles independently and matches the global scan when one window covers the map."""
+    from ultralytics.nn.modules.mamba_yolo import SS2D, XSSBlock, window_partition, window_reverse
+
+    x = torch.randn(2, 16, 13, 10)  # BCHW, not a multiple of the window size
+    for shift in 0, 2:
+        tiles, grid = window_partition(x, 4, shift)
+        assert torch.equal(window_reverse(tiles.permute(0, 2, 3, 1), grid, 13, 10, shift), x.permute(0, 2, 3, 1))
+
+    m, m_window, m_full = SS2D(d_model=16), SS2D(d_model=16, window_size=4), SS2D(d_model=16, window_size=16)
+    m_window.load_state_dict(m.state_dict())
+    m_full.load_state_dict(m.state_dict())
+    assert torch.allclose(m_full(x), m(x), atol=1e-6)
+    x2 = x.clone()
+    x2[..., 8:, :] += 1  # outside the top-left window
+    with torch.no_grad():  # inference path, sized chunks without saved states
+        y, y2 = m_window(x), m_window(x2)
+    assert torch.allclose(y[..., :4, :4], y2[..., :4, :4], atol=1e-6)
+    assert torch.allclose(y, m_window(x), atol=1e-5)  # matches the training path
+
+    m = XSSBlock(16, 16, n=2, ssm_window_size=4, ssm_shift_window=True)
+    assert [ss2d.shift for ss2d in m.ss2d] == [0, 2]  # alternating regular and shifted windows
+    m(x).sum().backward()
+
+
+@pytest.mark.parametrize("scan_mode", ["cross", "snake"])
+def test_nn_modules_ss2d_export(scan_mode):
+    """Test that SS2D in export mode traces to a graph of standard ops that matches eager outputs."""
+    from ultralytics.nn.modules.mamba_yolo import SS2D
+
+    x = torch.randn(1, 16, 12, 10)  # BCHW
+    for window_size in 0, 8:
+        m = SS2D(16, scan_mode=scan_mode, window_size=window_size).eval()
+        m.fuse()
+        with torch.no_grad():
+            y = m(x)
+            m.export = True
+            traced = torch.jit.trace(m, x)
+        assert not any(n.kind() == "prim::PythonOp" for n in traced.inlined_graph.nodes())  # no autograd Functions
+        assert torch.allclose(traced(x), y, atol=1e-5)
+
+
+def test_nn_modules_ss2d_cache():
+    """Test that eval-mode SS2D caches its fp32 scan parameters and drops them whenever the parameters may change."""
+    from ultralytics.nn.modules.mamba_yolo import SS2D
+
+    m, x = SS2D(16).eval(), torch.randn(1, 16, 8, 6)
+    with torch.no_grad():
+        y = m(x)
+        cache = m._scan_cache
+        assert cache is not None and torch.equal(m(x), y) and m._scan_cache is cache  # reused
+        m.A_logs.add_(0.1)  # in-place update bumps the version counter
+        assert not torch.equal(m(x), y)
+        m.load_state_dict(SS2D(16).state_dict())
+        assert m._scan_cache is None
+        m(x)
+    for fn in lambda: m.to("cpu"), m.train:
+        m._scan_cache = cache
+        fn()
+        assert m._scan_cache is None
+    m.eval()
+    m(x).sum().backward()  # gradients still reach the parameters in eval mode
+    assert m._scan_cache is None and m.A_logs.grad is not None
+
+
+def test_nn_modules_ss2d_precision():
+    """Test the mixed precision scan policy, bf16 activations with fp32 state, against the fp32 scan."""
+    from ultralytics.nn.modules.common_utils_mbyolo import selective_scan_torch
+    from ultralytics.nn.modules.mamba_yolo import SS2D
+
+    b, k, d, n, l = 1, 2, 8, 16, 1024  # a long sequence, a bf16 state would drift along it
+    u, delta, B, C = (torch.randn(*s).bfloat16() for s in ((b, k * d, l), (b, k * d, l), (b, k, n, l), (b, k, n, l)))
+    A, D, delta_bias = -torch.rand(k * d, n), torch.randn(k * d), torch.randn(k * d)
+    y = selective_scan_torch(u, delta, A, B, C, D, delta_bias, True)
+    y_ref = selective_scan_torch(u.float(), delta.float(), A, B.float(), C.float(), D, delta_bias, True)
+    assert y.dtype == torch.bfloat16 and (y.float() - y_ref).norm() < 1e-2 * y_ref.norm()
+
+    def run(m, amp):
+        """Return output, parameter gradients and bytes saved for backward of a training step."""
+        saved = []
+        with torch.autocast("cpu", dtype=torch.bfloat16, enabled=amp), torch.autograd.graph.saved_tensors_hooks(
+            lambda t: saved.append(t.numel() * t.element_size()) or t, lambda t: t
+        ):
+            y = m(x)
+        m.zero_grad()
+        y.float().square().mean().backward()
+        return y.float(), [p.grad.clone() for p in m.parameters()], sum(saved)
+
+    x = torch.randn(2, 16, 12, 10)
+    m = SS2D(16, scan_backend="torch").train()
+    y_ref, g_ref, saved_fp32 = run(m, False)
+    _, _, saved_amp = run(m, True)
+    m.precision = "mixed"
+    y, g, saved_mixed = run(m, True)
+    assert (y - y_ref).norm() < 2e-2 * y_ref.norm()
+    assert all((gi - gr).norm() <= 5e-2 * gr.norm() for gi, gr in zip(g, g_ref))
+    assert saved_mixed < saved_amp < saved_fp32
+    with pytest.raises(ValueError):
+        SS2D(16, precision="fp8")
+
+
+def test_nn_modules_mamba_quantize():
+    """Test dynamic INT8 quantization of the Mamba block projections, with and without calibration."""
+    from ultralytics.nn.modules.mamba_yolo import XSSBlock
+    from ultralytics.utils.quantize import DynamicQuantConv, quantize_dynamic_int8
+
+    torch.manual_seed(0)  # the INT8 error of a randomly initialized block varies with the seed
+    m, x = XSSBlock(16, 32, ssm_scan_mode="bidi").eval(), torch.randn(2, 16, 12, 10)
+    q = quantize_dynamic_int8(m)
+    assert not any(hasattr(s, "x_proj_weight") for s in q.ss2d)  # einsum replaced by a quantized projection
+    assert all(isinstance(s.x_proj, DynamicQuantConv) for s in q.ss2d)
+    with torch.no_grad():
+        y, yq = m(x), q(x)
+    assert (yq - y).norm() < 0.05 * y.norm()
+    q = quantize_dynamic_int8(m, [x], max_error=0.0)  # every layer errs on calibration, all stay fp32
+    assert not any(isinstance(s, DynamicQuantConv) for s in q.modules())
+
+
+def test_nn_modules_mamba_prune():
+    """Test structured channel pruning of the Mamba blocks of a detection model."""
+    from ultralytics.nn.tasks import DetectionModel
+    from ultralytics.utils.prune import prune_mamba
+    from ultralytics.utils.torch_utils import get_num_params
+
+    model = DetectionModel(ROOT / "cfg/models/mamba-yolo/Mamba-YOLO-T.yaml", nc=2, verbose=False).eval()
+    x = torch.randn(1, 3, 64, 64)
+    with torch.no_grad():
+        y = model(x)[0]
+        assert torch.equal(prune_mamba(model, 0.0, verbose=False).eval()(x)[0], y)  # nothing removed
+        pruned = prune_mamba(model, 0.5, verbose=False).eval()
+        assert pruned(x)[0].shape == y.shape
+    assert get_num_params(pruned) < get_num_params(model)
+    args = [a[-1][-1] for a in pruned.yaml["backbone"] + pruned.yaml["head"] if "SSBlock" in a[2]]
+    assert args and all(a["ssm_ratio"] < 2.0 for a in args)
+    DetectionModel(pruned.yaml, nc=2, verbose=False).load_state_dict(pruned.state_dict())  # YAML rebuilds the layout
+
+
+def test_nn_modules_mamba_channels_last():
+    """Test that LayerNorm2d and the Mamba blocks give the same result in both memory formats."""
+    from ultralytics.nn.modules.common_utils_mbyolo import LayerNorm2d
+    from ultralytics.nn.modules.mamba_yolo import VSSBlock, XSSBlock
+
+    x = torch.randn(2, 16, 12, 10)  # BCHW
+    norm = LayerNorm2d(16)
+    y = norm.norm(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)
+    assert torch.allclose(norm(x), y, atol=1e-5)
+    assert torch.allclose(norm(x.contiguous(memory_format=torch.channels_last)), y, atol=1e-5)
+
+    for block in VSSBlock, XSSBlock:
+        m, m_cl = block(16, 32), block(16, 32, channels_last=True)
+        m_cl.load_state_dict(m.state_dict())
+        y, y_cl = m(x), m_cl(x)
+        assert y_cl.is_contiguous()  # caller layout restored
+        assert torch.allclose(y, y_cl, atol=1e-4)
+
+
+def test_nn_modules_mamba_fuse():
+    """Test that fusing the Mamba-YOLO modules for inference removes all BatchNorm layers and keeps outputs."""
+    from ultralytics.nn.modules.mamba_yolo import SimpleStem, VisionClueMerge, VSSBlock, XSSBlock
+
+    x = torch.randn(2, 16, 12, 10)  # BCHW
+    for m in SimpleStem(16, 32), VisionClueMerge(16, 32), VSSBlock(16, 32), XSSBlock(16, 32, n=2):
+        for layer in m.modules():
+            if isinstance(layer, (torch.nn.BatchNorm2d, torch.nn.LayerNorm)):  # non-trivial statistics and affines
+                torch.nn.init.normal_(layer.weight, 1.0, 0.1)
+                torch.nn.init.normal_(layer.bias, 0.0, 0.1)
+            if isinstance(layer, torch.nn.BatchNorm2d):
+                layer.running_mean.normal_(0.0, 0.1)
+                layer.running_var.uniform_(0.5, 1.5)
+        m.eval()
+        with torch.no_grad():
+            y = m(x)
+            m.fuse()
+            assert not any(isinstance(layer, torch.nn.BatchNorm2d) for layer in m.modules())
+            assert torch.allclose(m(x), y, atol=1e-4)
+
+
+def test_nn_modules_mamba_checkpoint():
+    """Test that activation checkpointing in the Mamba blocks keeps gradients and saves activation memory."""
+    from ultralytics.nn.modules.mamba_yolo import VSSBlock, XSSBlock
+    from ultralytics.utils.torch_utils import get_saved_activation_bytes
+
+    x = torch.randn(2, 16, 12, 10)  # BCHW
+    for block in VSSBlock, XSSBlock:
+        m, m_ckpt = block(16, 32), block(16, 32, use_checkpoint=True)
+        m_ckpt.load_state_dict(m.state_dict())
+        m(x).square().sum().backward()
+        m_ckpt(x).square().sum().backward()
+        for p, p_ckpt in zip(m.parameters(), m_ckpt.parameters()):
+            assert torch.allclose(p.grad, p_ckpt.grad, atol=1e-4)
+        assert get_saved_activation_bytes(m_ckpt, 32) < get_saved_activation_bytes(m_ckpt, 32, use_checkpoint=False)
+
+
+def test_nn_modules_ss2d_cost():
+    """Test that the analytic SS2D scan cost is added to thop FLOPs once and follows input size and window padding."""
+    thop = pytest.importorskip("thop")
+    from ultralytics.nn.modules.mamba_yolo import SS2D
+    from ultralytics.utils.torch_utils import get_scan_cost, get_thop_custom_ops
+
+    m, x = SS2D(16).eval(), torch.zeros(1, 16, 16, 16)
+    cost = m.cost(x.shape)
+    assert cost["flops"] > 0 and cost["bytes"] > 0 and cost["saved"] > 0
+    children = thop.profile(m, [x], custom_ops={SS2D: lambda *args: None}, verbose=False)[0]  # child modules only
+    macs = thop.profile(m, [x], custom_ops=get_thop_custom_ops(m), verbose=False)[0]
+    assert macs == children + cost["flops"] // 2
+    assert get_scan_cost(m, torch.zeros(1, 16, 8, 8), scale=(2, 2)) == cost
+    assert SS2D(16, window_size=8).cost((1, 16, 12, 12)) == cost  # 12x12 padded to 4 windows of 8x8
+
+
 @pytest.mark.skipif(not ONLINE, reason="environment is offline")
 def test_hub():
     """Test Ultralytics HUB functionalities."""
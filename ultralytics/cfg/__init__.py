@@ -143,6 +143,9 @@ CFG_INT_KEYS = {  # integer-only arguments
     "line_width",
     "nbs",
     "save_period",
+    "ema_interval",
+    "trace_steps",
+    "assigner_chunk",
 }
 CFG_BOOL_KEYS = {  # boolean-only arguments
     "save",
@@ -179,6 +182,9 @@ CFG_BOOL_KEYS = {  # boolean-only arguments
     "nms",
     "profile",
     "multi_scale",
+    "use_checkpoint",
+    "save_safetensors",
+    "ensemble_concurrent",
 }
 
 
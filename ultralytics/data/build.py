@@ -1,5 +1,6 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
+import contextlib
 import os
 import random
 from pathlib import Path
@@ -56,6 +57,81 @@ class InfiniteDataLoader(dataloader.DataLoader):
         self.iterator = self._get_iterator()
 
 
+class DevicePrefetcher:
+    """
+    Iterates over a dataloader with every batch moved to a device and preprocessed there.
+
+    Batch tensors are copied from the dataloader's pinned memory with non-blocking copies, uint8 images included, so
+    `transform`, e.g. the image normalization of a trainer's `preprocess_batch`, runs on the device. On CUDA the next
+    batch is staged on a side stream while the current step computes; on other devices batches are moved and
+    transformed as they are drawn. `transform` runs in the context returned by `context`, e.g. the autocast of the
+    forward pass, so model-dependent preprocessing such as YOLO-World text encoding keeps its precision.
+
+    Attributes:
+        loader (Iterable): Dataloader yielding batch dicts.
+        device (torch.device): Device the batches are moved to.
+        transform (Callable): Applied to every batch after the move.
+        context (Callable): Returns the context manager `transform` runs in.
+        stream (torch.cuda.Stream | None): Side stream of the copies and transforms on CUDA.
+    """
+
+    def __init__(self, loader, device, transform=None, context=None):
+        """Initialize the prefetcher of `loader` for `device`, applying `transform` to each batch on the device."""
+        self.loader = loader
+        self.device = torch.device(device)
+        self.transform = transform or (lambda batch: batch)
+        self.context = context or contextlib.nullcontext
+        self.stream = torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+
+    def __len__(self):
+        """Returns the number of batches of the dataloader."""
+        return len(self.loader)
+
+    def __iter__(self):
+        """Yields the preprocessed device batches, staging the next one before the current one is returned."""
+        if self.stream is None:
+            for batch in self.loader:
+                yield self.apply(batch)
+            return
+        iterator = iter(self.loader)
+        batch = self.preload(iterator)
+        while batch is not None:
+            torch.cuda.current_stream(self.device).wait_stream(self.stream)
+            self.record_stream(batch)
+            next_batch = self.preload(iterator)
+            yield batch
+            batch = next_batch
+
+    def to_device(self, batch):
+        """Returns `batch` with its tensors copied to the device asynchronously."""
+        return {k: v.to(self.device, non_blocking=True) if isinstance(v, torch.Tensor) else v for k, v in batch.items()}
+
+    def preload(self, iterator):
+        """Draws the next batch from `iterator` and moves and transforms it on the side stream, None when exhausted."""
+        batch = next(iterator, None)
+        if batch is not None:
+            with torch.cuda.stream(self.stream):
+                batch = self.apply(batch)
+        return batch
+
+    def apply(self, batch):
+        """Returns `batch` moved to the device and transformed."""
+        batch = self.to_device(batch)
+        with self.context():
+            return self.transform(batch)
+
+    def record_stream(self, x):
+        """Marks the CUDA tensors of `x`, allocated on the side stream, as in use by the current stream."""
+        if isinstance(x, torch.Tensor) and x.is_cuda:
+            x.record_stream(torch.cuda.current_stream(self.device))
+        elif isinstance(x, dict):
+            for v in x.values():
+                self.record_stream(v)
+        elif isinstance(x, (list, tuple)):
+            for v in x:
+                self.record_stream(v)
+
+
 class _RepeatSampler:
     """
     Sampler that repeats forever.
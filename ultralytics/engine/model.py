@@ -237,7 +237,7 @@ class Model(nn.Module):
             weights = checks.check_file(weights)  # automatically download and return local filename
         weights = checks.check_model_file_from_stem(weights)  # add suffix, i.e. yolov8n -> yolov8n.pt
 
-        if Path(weights).suffix == ".pt":
+        if Path(weights).suffix in {".pt", ".safetensors"}:
             self.model, self.ckpt = attempt_load_one_weight(weights)
             self.task = self.model.args["task"]
             self.overrides = self.model.args = self._reset_ckpt_args(self.model.args)
@@ -253,7 +253,7 @@ class Model(nn.Module):
 
     def _check_is_pytorch_model(self) -> None:
         """Raises TypeError is model is not a PyTorch model."""
-        pt_str = isinstance(self.model, (str, Path)) and Path(self.model).suffix == ".pt"
+        pt_str = isinstance(self.model, (str, Path)) and Path(self.model).suffix in {".pt", ".safetensors"}
         pt_module = isinstance(self.model, nn.Module)
         if not (pt_module or pt_str):
             raise TypeError(
@@ -312,7 +312,8 @@ class Model(nn.Module):
         """
         Saves the current model state to a file.
 
-        This method exports the model's checkpoint (ckpt) to the specified filename.
+        This method exports the model's checkpoint (ckpt) to the specified filename. A *.safetensors filename saves the
+        memory-mapped weights and a *.yaml sidecar instead, see `ultralytics.utils.weights`.
 
         Args:
             filename (str | Path): The name of the file to save the model to. Defaults to 'saved_model.pt'.
@@ -322,6 +323,11 @@ class Model(nn.Module):
             AssertionError: If the model is not a PyTorch model.
         """
         self._check_is_pytorch_model()
+        if Path(filename).suffix == ".safetensors":
+            from ultralytics.utils.weights import save_weights
+
+            save_weights(self.model, filename, train_args=(self.ckpt or {}).get("train_args", {}))
+            return
         from datetime import datetime
 
         from ultralytics import __version__
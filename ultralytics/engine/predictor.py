@@ -303,6 +303,11 @@ class BasePredictor:
             batch=self.args.batch,
             fuse=True,
             verbose=verbose,
+            ensemble={
+                "concurrent": self.args.ensemble_concurrent,
+                "fusion": self.args.ensemble_fusion,
+                "fusion_weights": self.args.ensemble_weights,
+            },
         )
 
         self.device = self.model.device  # update device
@@ -22,7 +22,10 @@ from torch import distributed as dist
 from torch import nn, optim
 
 from ultralytics.cfg import get_cfg, get_save_dir
+from ultralytics.data.build import DevicePrefetcher
 from ultralytics.data.utils import check_cls_dataset, check_det_dataset
+from ultralytics.nn.modules import SS2D
+from ultralytics.nn.modules.common_utils_mbyolo import SCAN_PRECISIONS
 from ultralytics.nn.tasks import attempt_load_one_weight, attempt_load_weights
 from ultralytics.utils import (
     DEFAULT_CFG,
@@ -40,15 +43,20 @@ from ultralytics.utils.autobatch import check_train_batch_size
 from ultralytics.utils.checks import check_amp, check_file, check_imgsz, check_model_file_from_stem, print_args
 from ultralytics.utils.dist import ddp_cleanup, generate_ddp_command
 from ultralytics.utils.files import get_latest_run
+from ultralytics.utils.telemetry import StepTelemetry
 from ultralytics.utils.torch_utils import (
     EarlyStopping,
+    CheckpointWriter,
     ModelEMA,
     convert_optimizer_state_dict_to_fp16,
+    get_saved_activation_bytes,
     init_seeds,
     one_cycle,
     select_device,
     strip_optimizer,
+    write_atomic,
 )
+from ultralytics.utils.weights import save_weights, sidecar
 
 
 class BaseTrainer:
@@ -114,6 +122,10 @@ class BaseTrainer:
             yaml_save(self.save_dir / "args.yaml", vars(self.args))  # save run args
         self.last, self.best = self.wdir / "last.pt", self.wdir / "best.pt"  # checkpoint paths
         self.save_period = self.args.save_period
+        self.checkpoint_writer = CheckpointWriter()  # writes checkpoints in the background
+        trace = (10, 10 + self.args.trace_steps) if self.args.trace_steps > 0 and RANK in {-1, 0} else None
+        self.telemetry = StepTelemetry(self.device, trace=trace, trace_file=self.save_dir / "trace.json")
+        self.step_times = {}  # rolling mean milliseconds per step of each training phase
 
         self.batch_size = self.args.batch
         self.epochs = self.args.epochs
@@ -227,6 +239,11 @@ class BaseTrainer:
         ckpt = self.setup_model()
         self.model = self.model.to(self.device)
         self.set_model_attributes()
+        if self.args.save_safetensors and not isinstance(getattr(self.model, "yaml", None), dict):  # i.e. torchvision
+            LOGGER.warning(
+                "WARNING ⚠️ 'save_safetensors=True' requires a model built from a YAML, setting 'save_safetensors=False'"
+            )
+            self.args.save_safetensors = False
 
         # Freeze layers
         freeze_list = (
@@ -268,6 +285,27 @@ class BaseTrainer:
         self.args.imgsz = check_imgsz(self.args.imgsz, stride=gs, floor=gs, max_dim=1)
         self.stride = gs  # for multiscale training
 
+        # Selective scan precision
+        if self.args.ssm_precision:
+            if self.args.ssm_precision not in SCAN_PRECISIONS:
+                raise ValueError(f"Unknown ssm_precision '{self.args.ssm_precision}', choose from {SCAN_PRECISIONS}")
+            for m in self.model.modules():
+                if isinstance(m, SS2D):
+                    m.precision = self.args.ssm_precision
+
+        # Activation checkpointing
+        if self.args.use_checkpoint:
+            for m in self.model.modules():
+                if hasattr(m, "use_checkpoint"):
+                    m.use_checkpoint = True
+        if RANK in {-1, 0} and any(getattr(m, "use_checkpoint", False) for m in self.model.modules()):
+            full = get_saved_activation_bytes(self.model, self.args.imgsz, use_checkpoint=False)
+            ckpt = get_saved_activation_bytes(self.model, self.args.imgsz)
+            LOGGER.info(
+                f"{colorstr('checkpoint:')} activations saved for backward {full / 2**20:.1f}MB -> "
+                f"{ckpt / 2**20:.1f}MB per image at imgsz={self.args.imgsz} ({(full - ckpt) / 2**20:.1f}MB saved)"
+            )
+
         # Batch size
         if self.batch_size < 1 and RANK == -1:  # single-GPU only, estimate best batch size
             self.args.batch = self.batch_size = check_train_batch_size(
@@ -288,7 +326,7 @@ class BaseTrainer:
             self.validator = self.get_validator()
             metric_keys = self.validator.metrics.keys + self.label_loss_items(prefix="val")
             self.metrics = dict(zip(metric_keys, [0] * len(metric_keys)))
-            self.ema = ModelEMA(self.model)
+            self.ema = ModelEMA(self.model, interval=self.args.ema_interval)
             if self.args.plots:
                 self.plot_training_labels()
 
@@ -345,18 +383,22 @@ class BaseTrainer:
             self.model.train()
             if RANK != -1:
                 self.train_loader.sampler.set_epoch(epoch)
-            pbar = enumerate(self.train_loader)
             # Update dataloader attributes (optional)
             if epoch == (self.epochs - self.args.close_mosaic):
                 self._close_dataloader_mosaic()
                 self.train_loader.reset()
 
+            # Batches are moved to the device and preprocessed one step ahead, overlapped with compute on CUDA
+            autocast = lambda: torch.cuda.amp.autocast(self.amp)  # preprocessing runs under the AMP of the forward
+            batches = DevicePrefetcher(self.train_loader, self.device, self.preprocess_batch, autocast)
+            pbar = enumerate(self.telemetry.iterate(batches))  # times the wait for each batch
             if RANK in {-1, 0}:
                 LOGGER.info(self.progress_string())
-                pbar = TQDM(enumerate(self.train_loader), total=nb)
+                pbar = TQDM(pbar, total=nb)
             self.tloss = None
             for i, batch in pbar:
-                self.run_callbacks("on_train_batch_start")
+                with self.telemetry.time("callbacks"):
+                    self.run_callbacks("on_train_batch_start")
                 # Warmup
                 ni = i + nb * epoch
                 if ni <= nw:
@@ -371,8 +413,7 @@ class BaseTrainer:
                             x["momentum"] = np.interp(ni, xi, [self.args.warmup_momentum, self.args.momentum])
 
                 # Forward
-                with torch.cuda.amp.autocast(self.amp):
-                    batch = self.preprocess_batch(batch)
+                with self.telemetry.time("forward"), torch.cuda.amp.autocast(self.amp):
                     self.loss, self.loss_items = self.model(batch)
                     if RANK != -1:
                         self.loss *= world_size
@@ -381,11 +422,13 @@ class BaseTrainer:
                     )
 
                 # Backward
-                self.scaler.scale(self.loss).backward()
+                with self.telemetry.time("backward"):
+                    self.scaler.scale(self.loss).backward()
 
                 # Optimize - https://pytorch.org/docs/master/notes/amp_examples.html
                 if ni - last_opt_step >= self.accumulate:
-                    self.optimizer_step()
+                    with self.telemetry.time("optimizer"):
+                        self.optimizer_step()
                     last_opt_step = ni
 
                     # Timed stopping
@@ -399,19 +442,32 @@ class BaseTrainer:
                             break
 
                 # Log
-                mem = f"{torch.cuda.memory_reserved() / 1E9 if torch.cuda.is_available() else 0:.3g}G"  # (GB)
-                loss_len = self.tloss.shape[0] if len(self.tloss.shape) else 1
-                losses = self.tloss if loss_len > 1 else torch.unsqueeze(self.tloss, 0)
-                if RANK in {-1, 0}:
-                    pbar.set_description(
-                        ("%11s" * 2 + "%11.4g" * (2 + loss_len))
-                        % (f"{epoch + 1}/{self.epochs}", mem, *losses, batch["cls"].shape[0], batch["img"].shape[-1])
-                    )
-                    self.run_callbacks("on_batch_end")
-                    if self.args.plots and ni in self.plot_idx:
-                        self.plot_training_samples(batch, ni)
+                with self.telemetry.time("callbacks"):
+                    mem = f"{torch.cuda.memory_reserved() / 1E9 if torch.cuda.is_available() else 0:.3g}G"  # (GB)
+                    loss_len = self.tloss.shape[0] if len(self.tloss.shape) else 1
+                    losses = self.tloss if loss_len > 1 else torch.unsqueeze(self.tloss, 0)
+                    if RANK in {-1, 0}:
+                        pbar.set_description(
+                            ("%11s" * 2 + "%11.4g" * (2 + loss_len))
+                            % (
+                                f"{epoch + 1}/{self.epochs}",
+                                mem,
+                                *losses,
+                                batch["cls"].shape[0],
+                                batch["img"].shape[-1],
+                            )
+                        )
+                        self.run_callbacks("on_batch_end")
+                        if self.args.plots and ni in self.plot_idx:
+                            self.plot_training_samples(batch, ni)
+
+                    self.run_callbacks("on_train_batch_end")
 
-                self.run_callbacks("on_train_batch_end")
+                # Telemetry
+                self.telemetry.step()
+                if RANK in {-1, 0} and self.telemetry.steps % self.telemetry.window.maxlen == 0:
+                    self.step_times = self.telemetry.summary()
+                    self.run_callbacks("on_train_telemetry")
 
             self.lr = {f"lr/pg{ir}": x["lr"] for ir, x in enumerate(self.optimizer.param_groups)}  # for loggers
             self.run_callbacks("on_train_epoch_end")
@@ -422,7 +478,9 @@ class BaseTrainer:
                 # Validation
                 if self.args.val or final_epoch or self.stopper.possible_stop or self.stop:
                     self.metrics, self.fitness = self.validate()
-                self.save_metrics(metrics={**self.label_loss_items(self.tloss), **self.metrics, **self.lr})
+                self.step_times = self.telemetry.summary()
+                metrics = {**self.label_loss_items(self.tloss), **self.metrics, **self.lr, **self.step_times}
+                self.save_metrics(metrics=metrics)
                 self.stop |= self.stopper(epoch + 1, self.fitness) or final_epoch
                 if self.args.time:
                     self.stop |= (time.time() - self.train_time_start) > (self.args.time * 3600)
@@ -470,39 +528,57 @@ class BaseTrainer:
         self.run_callbacks("teardown")
 
     def save_model(self):
-        """Save model training checkpoints with additional metadata."""
+        """Save model training checkpoints with additional metadata, serialized and written in a background thread."""
+        files = [self.last]  # save last.pt
+        if self.best_fitness == self.fitness:
+            files.append(self.best)  # save best.pt
+        if (self.save_period > 0) and (self.epoch > 0) and (self.epoch % self.save_period == 0):
+            files.append(self.wdir / f"epoch{self.epoch}.pt")  # save epoch, i.e. 'epoch3.pt'
+        ckpt = {
+            "epoch": self.epoch,
+            "best_fitness": self.best_fitness,
+            "model": None,  # resume and final checkpoints derive from EMA
+            "ema": self.ema.ema,
+            "updates": self.ema.updates,
+            "optimizer": self.optimizer.state_dict(),
+            "train_args": vars(self.args),  # save as dict
+            "train_metrics": {**self.metrics, **{"fitness": self.fitness}},
+            "train_results": self.csv.read_text(),
+            "date": datetime.now().isoformat(),
+            "version": __version__,
+            "license": "AGPL-3.0 (https://ultralytics.com/license)",
+            "docs": "https://docs.ultralytics.com",
+        }
+        self.checkpoint_writer.save(ckpt, lambda x: self.write_checkpoint(x, files))
+
+    def write_checkpoint(self, ckpt, files):
+        """Serialize checkpoint snapshot `ckpt` and write it to `files`, runs in the checkpoint writer thread."""
         import io
 
         import pandas as pd  # scope for faster 'import ultralytics'
 
+        ema = ckpt["ema"]  # FP32 CPU snapshot
+        results = pd.read_csv(io.StringIO(ckpt["train_results"])).to_dict(orient="list")
+        ckpt["train_results"] = {k.strip(): v for k, v in results.items()}
+
         # Serialize ckpt to a byte buffer once (faster than repeated torch.save() calls)
         buffer = io.BytesIO()
         torch.save(
-            {
-                "epoch": self.epoch,
-                "best_fitness": self.best_fitness,
-                "model": None,  # resume and final checkpoints derive from EMA
-                "ema": deepcopy(self.ema.ema).half(),
-                "updates": self.ema.updates,
-                "optimizer": convert_optimizer_state_dict_to_fp16(deepcopy(self.optimizer.state_dict())),
-                "train_args": vars(self.args),  # save as dict
-                "train_metrics": {**self.metrics, **{"fitness": self.fitness}},
-                "train_results": {k.strip(): v for k, v in pd.read_csv(self.csv).to_dict(orient="list").items()},
-                "date": datetime.now().isoformat(),
-                "version": __version__,
-                "license": "AGPL-3.0 (https://ultralytics.com/license)",
-                "docs": "https://docs.ultralytics.com",
-            },
+            {**ckpt, "ema": deepcopy(ema).half(), "optimizer": convert_optimizer_state_dict_to_fp16(ckpt["optimizer"])},
             buffer,
         )
         serialized_ckpt = buffer.getvalue()  # get the serialized content to save
-
-        # Save checkpoints
-        self.last.write_bytes(serialized_ckpt)  # save last.pt
-        if self.best_fitness == self.fitness:
-            self.best.write_bytes(serialized_ckpt)  # save best.pt
-        if (self.save_period > 0) and (self.epoch > 0) and (self.epoch % self.save_period == 0):
-            (self.wdir / f"epoch{self.epoch}.pt").write_bytes(serialized_ckpt)  # save epoch, i.e. 'epoch3.pt'
+        for f in files:
+            write_atomic(f, serialized_ckpt)
+
+        # Save memory-mapped weights, loaded without unpickling, i.e. 'last.safetensors' and 'last.yaml'
+        if self.args.save_safetensors:
+            metadata = {k: ckpt[k] for k in ("epoch", "best_fitness", "train_args", "train_metrics")}
+            for f in (f for f in files if f in {self.last, self.best}):  # not epoch checkpoints
+                f, tmp = f.with_suffix(".safetensors"), f.with_name(f".{f.stem}.tmp.safetensors")
+                save_weights(ema, tmp, **metadata)
+                os.replace(sidecar(tmp), sidecar(f))
+                os.replace(tmp, f)
 
     def get_dataset(self):
         """
@@ -534,7 +610,7 @@ class BaseTrainer:
 
         cfg, weights = self.model, None
         ckpt = None
-        if str(self.model).endswith(".pt"):
+        if str(self.model).endswith((".pt", ".safetensors")):
             weights, ckpt = attempt_load_one_weight(self.model)
             cfg = weights.yaml
         elif isinstance(self.args.pretrained, (str, Path)):
@@ -550,7 +626,8 @@ class BaseTrainer:
         self.scaler.update()
         self.optimizer.zero_grad()
         if self.ema:
-            self.ema.update(self.model)
+            with self.telemetry.time("ema"):
+                self.ema.update(self.model)
 
     def preprocess_batch(self, batch):
         """Allows custom preprocessing model inputs and ground truths depending on task type."""
@@ -633,6 +710,7 @@ class BaseTrainer:
 
     def final_eval(self):
         """Performs final evaluation and validation for object detection YOLO model."""
+        self.checkpoint_writer.wait()
         for f in self.last, self.best:
             if f.exists():
                 strip_optimizer(f)  # strip optimizers
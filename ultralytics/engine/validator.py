@@ -127,6 +127,11 @@ class BaseValidator:
                 dnn=self.args.dnn,
                 data=self.args.data,
                 fp16=self.args.half,
+                ensemble={
+                    "concurrent": self.args.ensemble_concurrent,
+                    "fusion": self.args.ensemble_fusion,
+                    "fusion_weights": self.args.ensemble_weights,
+                },
             )
             # self.model = model
             self.device = model.device  # update device
@@ -85,10 +85,10 @@ class DetectionTrainer(BaseTrainer):
 
     def get_model(self, cfg=None, weights=None, verbose=True):
         """Return a YOLO detection model."""
-        model = DetectionModel(cfg, nc=self.data["nc"], verbose=verbose and RANK == -1)
-        if weights:
-            model.load(weights)
-        return model
+        verbose = verbose and RANK == -1
+        if weights:  # built without random init, straight from the weights
+            return DetectionModel.from_weights(weights, cfg, nc=self.data["nc"], verbose=verbose)
+        return DetectionModel(cfg, nc=self.data["nc"], verbose=verbose)
 
     def get_validator(self):
         """Returns a DetectionValidator for YOLO model validation."""
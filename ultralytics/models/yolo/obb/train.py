@@ -30,11 +30,10 @@ class OBBTrainer(yolo.detect.DetectionTrainer):
 
     def get_model(self, cfg=None, weights=None, verbose=True):
         """Return OBBModel initialized with specified config and weights."""
-        model = OBBModel(cfg, ch=3, nc=self.data["nc"], verbose=verbose and RANK == -1)
-        if weights:
-            model.load(weights)
-
-        return model
+        verbose = verbose and RANK == -1
+        if weights:  # built without random init, straight from the weights
+            return OBBModel.from_weights(weights, cfg, ch=3, nc=self.data["nc"], verbose=verbose)
+        return OBBModel(cfg, ch=3, nc=self.data["nc"], verbose=verbose)
 
     def get_validator(self):
         """Return an instance of OBBValidator for validation of YOLO model."""
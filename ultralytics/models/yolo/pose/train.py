@@ -37,11 +37,10 @@ class PoseTrainer(yolo.detect.DetectionTrainer):
 
     def get_model(self, cfg=None, weights=None, verbose=True):
         """Get pose estimation model with specified configuration and weights."""
-        model = PoseModel(cfg, ch=3, nc=self.data["nc"], data_kpt_shape=self.data["kpt_shape"], verbose=verbose)
-        if weights:
-            model.load(weights)
-
-        return model
+        kwargs = dict(ch=3, nc=self.data["nc"], data_kpt_shape=self.data["kpt_shape"], verbose=verbose)
+        if weights:  # built without random init, straight from the weights
+            return PoseModel.from_weights(weights, cfg, **kwargs)
+        return PoseModel(cfg, **kwargs)
 
     def set_model_attributes(self):
         """Sets keypoints shape attribute of PoseModel."""
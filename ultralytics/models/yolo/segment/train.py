@@ -31,11 +31,10 @@ class SegmentationTrainer(yolo.detect.DetectionTrainer):
 
     def get_model(self, cfg=None, weights=None, verbose=True):
         """Return SegmentationModel initialized with specified config and weights."""
-        model = SegmentationModel(cfg, ch=3, nc=self.data["nc"], verbose=verbose and RANK == -1)
-        if weights:
-            model.load(weights)
-
-        return model
+        verbose = verbose and RANK == -1
+        if weights:  # built without random init, straight from the weights
+            return SegmentationModel.from_weights(weights, cfg, ch=3, nc=self.data["nc"], verbose=verbose)
+        return SegmentationModel(cfg, ch=3, nc=self.data["nc"], verbose=verbose)
 
     def get_validator(self):
         """Return an instance of SegmentationValidator for validation of YOLO model."""
@@ -89,6 +89,7 @@ class AutoBackend(nn.Module):
         batch=1,
         fuse=True,
         verbose=True,
+        ensemble=None,
     ):
         """
         Initialize the AutoBackend for inference.
@@ -102,6 +103,7 @@ class AutoBackend(nn.Module):
             batch (int): Batch-size to assume for inference.
             fuse (bool): Fuse Conv2D + BatchNorm layers for optimization. Defaults to True.
             verbose (bool): Enable verbose logging. Defaults to True.
+            ensemble (dict, optional): `Ensemble` options for a list of PyTorch weights, e.g. {'fusion': 'wbf'}.
         """
         super().__init__()
         w = str(weights[0] if isinstance(weights, list) else weights)
@@ -155,7 +157,7 @@ class AutoBackend(nn.Module):
             from ultralytics.nn.tasks import attempt_load_weights
 
             model = attempt_load_weights(
-                weights if isinstance(weights, list) else w, device=device, inplace=True, fuse=fuse
+                weights if isinstance(weights, list) else w, device=device, inplace=True, fuse=fuse, **(ensemble or {})
             )
             if hasattr(model, "kpt_shape"):
                 kpt_shape = model.kpt_shape  # pose-only
@@ -650,6 +652,7 @@ class AutoBackend(nn.Module):
             check_suffix(p, sf)  # checks
         name = Path(p).name
         types = [s in name for s in sf]
+        types[0] |= name.endswith(".safetensors")  # memory-mapped PyTorch weights, see ultralytics.utils.weights
         types[5] |= name.endswith(".mlmodel")  # retain support for older Apple CoreML *.mlmodel formats
         types[8] &= not types[9]  # tflite &= not edgetpu
         if any(types):
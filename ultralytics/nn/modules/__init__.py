@@ -76,7 +76,7 @@ from .transformer import (
     TransformerLayer,
 )
 
-from .mamba_yolo import SimpleStem, VisionClueMerge, VSSBlock, XSSBlock
+from .mamba_yolo import SS2D, SimpleStem, VisionClueMerge, VSSBlock, XSSBlock
 
 __all__ = (
     "Conv",
@@ -137,5 +137,5 @@ __all__ = (
     "CBFuse",
     "CBLinear",
     "Silence",
-    "SimpleStem", "VisionClueMerge", "VSSBlock", "XSSBlock"
+    "SS2D", "SimpleStem", "VisionClueMerge", "VSSBlock", "XSSBlock"
 )
@@ -1,43 +1,40 @@
 import torch
+import importlib
 import math
-from functools import partial
+import os
+from contextlib import nullcontext
+from functools import lru_cache, partial
 from typing import Callable, Any
 
 import torch.nn as nn
+import torch.nn.functional as F
 from einops import rearrange, repeat
 from timm.models.layers import DropPath
 
+from ultralytics.utils import LOGGER
+
 DropPath.__repr__ = lambda self: f"timm.DropPath({self.drop_prob})"
-try:
-    import selective_scan_cuda_core
-    import selective_scan_cuda_oflex
-    import selective_scan_cuda_ndstate
-    import selective_scan_cuda_nrow
-    import selective_scan_cuda
-except:
-    pass
-
-try:
-    "sscore acts the same as mamba_ssm"
-    import selective_scan_cuda_core
-except Exception as e:
-    print(e, flush=True)
-    "you should install mamba_ssm to use this"
-    SSMODE = "mamba_ssm"
-    import selective_scan_cuda
-    # from mamba_ssm.ops.selective_scan_interface import selective_scan_fn, selective_scan_ref
 
 
 class LayerNorm2d(nn.Module):
+    """
+    LayerNorm over the channels of a (B, C, H, W) tensor that preserves the memory format of its input.
+
+    Channels-last inputs are normalized through a permuted view, contiguous inputs with channel-first statistics, so
+    neither path copies the activation into another layout.
+    """
 
     def __init__(self, normalized_shape, eps=1e-6, elementwise_affine=True):
         super().__init__()
         self.norm = nn.LayerNorm(normalized_shape, eps, elementwise_affine)
 
     def forward(self, x):
-        x = rearrange(x, 'b c h w -> b h w c').contiguous()
-        x = self.norm(x)
-        x = rearrange(x, 'b h w c -> b c h w').contiguous()
+        if x.is_contiguous(memory_format=torch.channels_last):  # (B, H, W, C) in memory
+            return self.norm(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)
+        var, mean = torch.var_mean(x, dim=1, keepdim=True, unbiased=False)
+        x = (x - mean) * torch.rsqrt(var + self.norm.eps)
+        if self.norm.weight is not None:
+            x = torch.addcmul(self.norm.bias.view(-1, 1, 1), x, self.norm.weight.view(-1, 1, 1))
         return x
 
 
@@ -96,7 +93,61 @@ class CrossMerge(torch.autograd.Function):
         return xs, None, None
 
 
+# selective scan backends ===============================
+SELECTIVE_SCAN_BACKENDS = {}  # name -> (autograd Function, compiled CUDA extension it needs or None), by priority
+
+
+def register_selective_scan(name, extension=None):
+    """Register an autograd Function with the `SelectiveScanCore.apply` signature as selective scan backend `name`."""
+
+    def decorator(fn):
+        SELECTIVE_SCAN_BACKENDS[name] = (fn, extension)
+        return fn
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def load_extension(name):
+    """Import compiled extension `name` on first use, returns None if it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def selective_scan_available(name, device_type="cuda"):
+    """Whether selective scan backend `name` can run on `device_type`, importing its extension if needed."""
+    extension = SELECTIVE_SCAN_BACKENDS[name][1]
+    return extension is None or (device_type == "cuda" and load_extension(extension) is not None)
+
+
+@lru_cache(maxsize=None)
+def get_selective_scan(backend=None, device_type="cuda"):
+    """
+    Resolve the selective scan autograd Function for `device_type`, the first time it is needed and cached after.
+
+    Args:
+        backend (str, optional): Name in SELECTIVE_SCAN_BACKENDS. Defaults to the SELECTIVE_SCAN_BACKEND environment
+            variable, else the highest priority backend available on `device_type`.
+        device_type (str): Device type of the scanned tensors.
+
+    Returns:
+        (torch.autograd.Function): The backend, "torch" if the requested one can not run on `device_type`.
+    """
+    backend = backend or os.environ.get("SELECTIVE_SCAN_BACKEND") or None
+    if backend is not None and backend not in SELECTIVE_SCAN_BACKENDS:
+        raise ValueError(f"Unknown selective scan backend '{backend}', choose from {list(SELECTIVE_SCAN_BACKENDS)}")
+    if backend is None:
+        backend = next(k for k in SELECTIVE_SCAN_BACKENDS if selective_scan_available(k, device_type))
+    elif not selective_scan_available(backend, device_type):
+        LOGGER.warning(f"WARNING ⚠️ selective scan backend '{backend}' unavailable on {device_type}, using 'torch'")
+        backend = "torch"
+    return SELECTIVE_SCAN_BACKENDS[backend][0]
+
+
 # cross selective scan ===============================
+@register_selective_scan("core", extension="selective_scan_cuda_core")
 class SelectiveScanCore(torch.autograd.Function):
     # comment all checks if inside cross_selective_scan
     @staticmethod
@@ -122,7 +173,9 @@ class SelectiveScanCore(torch.autograd.Function):
             ctx.squeeze_C = True
         ctx.delta_softplus = delta_softplus
         ctx.backnrows = backnrows
-        out, x, *rest = selective_scan_cuda_core.fwd(u, delta, A, B, C, D, delta_bias, delta_softplus, 1)
+        out, x, *rest = load_extension("selective_scan_cuda_core").fwd(
+            u, delta, A, B, C, D, delta_bias, delta_softplus, 1
+        )
         ctx.save_for_backward(u, delta, A, B, C, D, delta_bias, x)
         return out
 
@@ -132,12 +185,331 @@ class SelectiveScanCore(torch.autograd.Function):
         u, delta, A, B, C, D, delta_bias, x = ctx.saved_tensors
         if dout.stride(-1) != 1:
             dout = dout.contiguous()
-        du, ddelta, dA, dB, dC, dD, ddelta_bias, *rest = selective_scan_cuda_core.bwd(
+        du, ddelta, dA, dB, dC, dD, ddelta_bias, *rest = load_extension("selective_scan_cuda_core").bwd(
             u, delta, A, B, C, D, delta_bias, dout, x, ctx.delta_softplus, 1
         )
         return (du, ddelta, dA, dB, dC, dD, ddelta_bias, None, None, None, None)
 
 
+def autocast_disabled(device):
+    """Context that disables autocast on the type of `device`, a no-op on the meta device which has no autocast."""
+    return nullcontext() if device.type == "meta" else torch.autocast(device.type, enabled=False)
+
+
+def selective_scan_torch(u, delta, A, B, C, D=None, delta_bias=None, delta_softplus=False, chunksize=16):
+    """
+    Selective scan written with standard PyTorch ops, numerically equivalent to `selective_scan_cuda_core.fwd`.
+
+    Evaluates h_t = exp(delta_t * A) * h_{t-1} + delta_t * B_t * u_t and y_t = C_t * h_t + D * u_t in fp32. The
+    sequence is processed in chunks of `chunksize`; inside a chunk a log-depth (Hillis-Steele) scan combines decay
+    factors in (0, 1] only, so unlike the cumsum/exp formulation of `selective_scan_easy` it cannot overflow. Half
+    precision inputs are upcast one chunk at a time, so only the state and the chunk being scanned are held in fp32.
+
+    Args:
+        u (torch.Tensor): Input of shape (B, K * D, L).
+        delta (torch.Tensor): Step sizes of shape (B, K * D, L).
+        A (torch.Tensor): State matrix of shape (K * D, N).
+        B (torch.Tensor): Input projections of shape (B, K, N, L) or (B, N, L).
+        C (torch.Tensor): Output projections of shape (B, K, N, L) or (B, N, L).
+        D (torch.Tensor, optional): Skip weights of shape (K * D).
+        delta_bias (torch.Tensor, optional): Bias added to `delta`, shape (K * D).
+        delta_softplus (bool): Apply softplus to `delta` after adding the bias.
+        chunksize (int): Sequence length processed per step of the outer loop.
+
+    Returns:
+        (torch.Tensor): Output of shape (B, K * D, L) with the dtype of `u`.
+    """
+    if B.dim() == 3:
+        B = B.unsqueeze(1)
+    if C.dim() == 3:
+        C = C.unsqueeze(1)
+    b, k, n, l = B.shape
+    u = u.view(b, k, -1, l).permute(3, 0, 1, 2)  # (l, b, k, d), sequence first so chunks are contiguous
+    delta = delta.view(b, k, -1, l).permute(3, 0, 1, 2)
+    A = A.float().view(k, -1, n)
+    B, C = B.permute(3, 0, 1, 2), C.permute(3, 0, 1, 2)  # (l, b, k, n)
+    delta_bias = 0 if delta_bias is None else delta_bias.float().view(k, -1)
+
+    with autocast_disabled(u.device):
+        h = u.new_zeros((b, k, u.shape[3], n), dtype=torch.float)  # state carried across chunks
+        ys = []
+        for i in range(0, l, chunksize):
+            ui, dt = u[i:i + chunksize].float(), delta[i:i + chunksize].float() + delta_bias
+            if delta_softplus:
+                dt = F.softplus(dt)
+            y, h = selective_scan_chunk(dt, ui, A, B[i:i + chunksize].float(), C[i:i + chunksize].float(), h)
+            if D is not None:
+                y = torch.addcmul(y, D.float().view(k, -1), ui)
+            ys.append(y.to(u.dtype))
+    return torch.cat(ys).permute(1, 2, 3, 0).reshape(b, -1, l)
+
+
+def selective_scan_chunk(dt, u, A, B, C, h):
+    """
+    Scan one sequence-first chunk starting from state `h`.
+
+    Args:
+        dt (torch.Tensor): Step sizes after bias and softplus, shape (t, b, k, d).
+        u (torch.Tensor): Input of shape (t, b, k, d).
+        A (torch.Tensor): State matrix of shape (k, d, n).
+        B (torch.Tensor): Input projections of shape (t, b, k, n).
+        C (torch.Tensor): Output projections of shape (t, b, k, n).
+        h (torch.Tensor): State entering the chunk, shape (b, k, d, n).
+
+    Returns:
+        (tuple): Output (t, b, k, d) without the D skip term, and the state (b, k, d, n) after the last step.
+    """
+    dt = dt.unsqueeze(-1)  # (t, b, k, d, 1)
+    dA = torch.exp(dt * A)  # (t, b, k, d, n)
+    dBu = (dt * u.unsqueeze(-1)) * B.unsqueeze(3)
+    s, t = 1, dA.shape[0]
+    while s < t:  # inclusive scan of (dA, dBu) pairs under (a1, b1) o (a2, b2) = (a1 * a2, a2 * b1 + b2)
+        dBu = torch.cat((dBu[:s], torch.addcmul(dBu[s:], dA[s:], dBu[:-s])))
+        dA = torch.cat((dA[:s], dA[s:] * dA[:-s]))
+        s *= 2
+    hs = torch.addcmul(dBu, dA, h)
+    return torch.einsum("tbkdn,tbkn->tbkd", hs, C), hs[-1]
+
+
+@register_selective_scan("torch")
+class SelectiveScanTorch(torch.autograd.Function):
+    """
+    Drop-in replacement for `SelectiveScanCore` that runs on any device without the compiled extension.
+
+    Like the CUDA kernel only the inputs are saved; the scan is recomputed in backward and differentiated with
+    autograd, so gradients match the reference recurrence exactly.
+    """
+
+    chunksize = 16
+
+    @staticmethod
+    @torch.cuda.amp.custom_fwd
+    def forward(ctx, u, delta, A, B, C, D=None, delta_bias=None, delta_softplus=False, nrows=1, backnrows=1,
+                oflex=True):
+        ctx.delta_softplus = delta_softplus
+        ctx.save_for_backward(u, delta, A, B, C, D, delta_bias)
+        return selective_scan_torch(u, delta, A, B, C, D, delta_bias, delta_softplus, SelectiveScanTorch.chunksize)
+
+    @staticmethod
+    @torch.cuda.amp.custom_bwd
+    def backward(ctx, dout, *args):
+        saved = ctx.saved_tensors
+        with torch.enable_grad():
+            inputs = [t.detach().requires_grad_() if t is not None else None for t in saved]
+            out = selective_scan_torch(*inputs, ctx.delta_softplus, SelectiveScanTorch.chunksize)
+            grads = torch.autograd.grad(out, [t for t in inputs if t is not None], dout)
+        grads = iter(grads)
+        return (*(next(grads) if t is not None else None for t in saved), None, None, None, None)
+
+
+@register_selective_scan("export")
+class SelectiveScanExport:
+    """
+    Inference-only selective scan made of standard ops, for `torch.jit.trace` and `torch.onnx.export`.
+
+    Not an autograd Function, so tracing records the scan itself rather than an opaque Python op. The chunk loop is
+    unrolled into the graph, hence the larger chunks; the log-depth scan inside a chunk stays stable at any length.
+    """
+
+    chunksize = 128
+
+    @staticmethod
+    def apply(u, delta, A, B, C, D=None, delta_bias=None, delta_softplus=False, nrows=1, backnrows=1, oflex=True):
+        return selective_scan_torch(u, delta, A, B, C, D, delta_bias, delta_softplus, SelectiveScanExport.chunksize)
+
+
+SCAN_MODES = {"cross": 4, "bidi": 2, "unidi": 1, "snake": 4}  # number of scan directions K of each scan mode
+SCAN_PRECISIONS = ("fp32", "mixed")  # scan input dtype while training: fp32, or the autocast dtype with fp32 state
+
+
+def cross_scan_index(H, W, device=None, mode="cross"):
+    """
+    Spatial positions visited by the scan directions of `mode`, shape (K, H * W).
+
+    Row k holds, for every scan step, the index into the row-major flattened (H, W) map. Modes are "cross" (row-major,
+    column-major and the reverse of both), "bidi" (row-major and its reverse), "unidi" (row-major only) and "snake"
+    (like "cross" but every other row or column is walked backwards, so consecutive steps stay spatial neighbours).
+    Gathering with these indices replaces the flipped and transposed copies made by `CrossScan`.
+    """
+    grid = torch.arange(H * W, device=device).view(H, W)
+    i, t = grid.flatten(), grid.t().flatten()
+    if mode == "snake":
+        rows, cols = grid.clone(), grid.t().clone()
+        rows[1::2], cols[1::2] = rows[1::2].flip(-1), cols[1::2].flip(-1)
+        i, t = rows.flatten(), cols.flatten()
+    if mode in {"cross", "snake"}:
+        return torch.stack((i, t, i.flip(0), t.flip(0)))
+    if mode == "bidi":
+        return torch.stack((i, i.flip(0)))
+    if mode == "unidi":
+        return i.unsqueeze(0)
+    raise ValueError(f"Unknown scan mode '{mode}', choose from {list(SCAN_MODES)}")
+
+
+def selective_scan_cost(B, K, D, N, L, R, chunksize=16, element_size=4):
+    """
+    Analytic cost of a cross selective scan, the projections, recurrence and merge that no child module accounts for.
+
+    FLOPs follow the usual 9 * B * D * N * L estimate of the recurrence (discretize A and B, update the state and
+    contract it with C) plus the x and step-size projections, the D skip and the merge of the K directions. Bytes moved
+    count every stage as a separate pass over memory. Saved bytes are what `CrossSelectiveScanTorch` keeps for
+    backward: its inputs and the state at every chunk boundary.
+
+    Args:
+        B (int): Batch size, including windows when the scan runs per window.
+        K (int): Number of scan directions.
+        D (int): Inner channels.
+        N (int): State size.
+        L (int): Sequence length, H * W.
+        R (int): Step-size rank.
+        chunksize (int): Scan steps between saved states.
+        element_size (int): Bytes per element, the scan runs in fp32.
+
+    Returns:
+        (dict): Costs as {"flops": int, "bytes": int, "saved": int}.
+    """
+    BDL, BKDL, BKPL = B * D * L, B * K * D * L, B * K * (R + 2 * N) * L
+    flops = 2 * BKPL * D + 2 * BKDL * R + 9 * BKDL * N + 2 * BKDL + B * (K - 1) * D * L
+    moved = 2 * BDL + BKPL + B * K * R * L + 5 * BKDL + 2 * B * K * N * L + K * D * (N + R + 2)
+    saved = BDL + BKPL + B * K * D * N * math.ceil(L / chunksize)
+    return {"flops": flops, "bytes": moved * element_size, "saved": saved * element_size}
+
+
+def cross_selective_scan_chunk(u, x_dbl, dt_projs_weight, dt_projs_bias, A, D, h, delta_softplus=True):
+    """
+    Project step sizes for one gathered chunk of all K directions and scan it.
+
+    Args:
+        u (torch.Tensor): Input of shape (t, b, k, d).
+        x_dbl (torch.Tensor): Output of `x_proj_weight` of shape (t, b, k, r + 2 * n).
+        dt_projs_weight (torch.Tensor): Step size projections of shape (k, d, r).
+        dt_projs_bias (torch.Tensor): Step size biases of shape (k, d).
+        A (torch.Tensor): State matrix of shape (k, d, n).
+        D (torch.Tensor): Skip weights of shape (k, d).
+        h (torch.Tensor): State entering the chunk, shape (b, k, d, n).
+        delta_softplus (bool): Apply softplus to the projected step sizes.
+
+    Returns:
+        (tuple): Output (t, b, k, d) and the state (b, k, d, n) after the last step.
+    """
+    k, d, r = dt_projs_weight.shape
+    dts, Bs, Cs = torch.split(x_dbl, [r, A.shape[-1], A.shape[-1]], dim=-1)
+    dts = torch.einsum("tbkr,kdr->tbkd", dts, dt_projs_weight).contiguous() + dt_projs_bias
+    if delta_softplus:
+        dts = F.softplus(dts)
+    y, h = selective_scan_chunk(dts, u, A, Bs, Cs, h)
+    return torch.addcmul(y, D, u), h
+
+
+class CrossSelectiveScanTorch(torch.autograd.Function):
+    """
+    Copy-free cross selective scan for the PyTorch backend.
+
+    Rather than materializing the (B, K, D, L) direction tensors of `CrossScan`, the step sizes and the merged output,
+    each chunk of every direction is gathered from the row-major input through `cross_scan_index` and the result is
+    scatter-added straight back into a single (B, D, L) output. Forward saves only the inputs and the state at each
+    chunk boundary; backward walks the chunks in reverse, recomputing one chunk at a time. Without gradients no
+    boundary states are kept, and chunks shrink so that a chunk of all (b, k, d, n) states stays within
+    `chunk_elements`, which keeps large batches of windowed scans cache resident.
+
+    `x` and `x_dbl` are saved and gathered in their own dtype, e.g. bf16 under autocast, while every chunk is scanned
+    and the states are carried in fp32 with autocast disabled. Pass fp32 inputs to keep the activations in fp32 too.
+    """
+
+    chunksize = 16
+    chunk_elements = 1 << 17
+
+    @staticmethod
+    def _gather(t, idx):
+        """Gather scan positions `idx` (k, c) from spatial (b, k or 1, d, l) tensor `t` into (c, b, k, d)."""
+        b, _, d, l = t.shape
+        k, c = idx.shape
+        t = t.expand(b, k, d, l)
+        return torch.gather(t, 3, idx.view(1, k, 1, c).expand(b, k, d, c)).permute(3, 0, 1, 2).contiguous()
+
+    @staticmethod
+    def _scatter(out, idx, t):
+        """Scatter-add (c, b, k, d) chunk `t` into spatial (b, l, d) tensor `out` at positions `idx` (k, c)."""
+        c, b, k, d = t.shape
+        out.index_add_(1, idx.flatten(), t.permute(1, 2, 0, 3).reshape(b, k * c, d))
+
+    @staticmethod
+    def forward(ctx, x, x_dbl, dt_projs_weight, dt_projs_bias, A, D, index, delta_softplus=True, save=True):
+        """
+        Args:
+            x (torch.Tensor): Row-major input of shape (B, D, L).
+            x_dbl (torch.Tensor): Row-major `x_proj_weight` outputs of shape (B, K, R + 2 * N, L).
+            dt_projs_weight (torch.Tensor): Shape (K, D, R).
+            dt_projs_bias (torch.Tensor): Shape (K, D).
+            A (torch.Tensor): Shape (K * D, N).
+            D (torch.Tensor): Shape (K * D).
+            index (torch.Tensor): Scan order of each direction, shape (K, L), see `cross_scan_index`.
+            delta_softplus (bool): Apply softplus to the projected step sizes.
+            save (bool): Keep what backward needs, False when gradients are disabled.
+
+        Returns:
+            (torch.Tensor): Sum over directions of the scan outputs in row-major order, shape (B, D, L) stored as
+                (B, L, D) so that a channels-last `out_norm` reads it without a copy, in the dtype of `x`.
+        """
+        b, d, l = x.shape
+        k, n = index.shape[0], A.shape[-1]
+        params = [t.float() for t in (dt_projs_weight, dt_projs_bias, A.view(k, d, n), D.view(k, d))]
+        x = x.unsqueeze(1)
+        with autocast_disabled(x.device):
+            y = x.new_zeros((b, l, d), dtype=torch.float)
+            h = x.new_zeros((b, k, d, n), dtype=torch.float)
+            c = CrossSelectiveScanTorch.chunksize
+            if not save:
+                c = max(1, min(c, CrossSelectiveScanTorch.chunk_elements // h.numel()))
+            states = []
+            for i in range(0, l, c):
+                idx = index[:, i:i + c]
+                if save:
+                    states.append(h)
+                u = CrossSelectiveScanTorch._gather(x, idx).float()
+                xd = CrossSelectiveScanTorch._gather(x_dbl, idx).float()
+                ys, h = cross_selective_scan_chunk(u, xd, *params, h, delta_softplus)
+                CrossSelectiveScanTorch._scatter(y, idx, ys)
+        if save:
+            ctx.delta_softplus = delta_softplus
+            ctx.save_for_backward(x, x_dbl, dt_projs_weight, dt_projs_bias, A, D, index, torch.stack(states))
+        return y.transpose(1, 2).to(x.dtype)
+
+    @staticmethod
+    def backward(ctx, dy):
+        x, x_dbl, dt_projs_weight, dt_projs_bias, A, D, index, states = ctx.saved_tensors
+        b, _, d, l = x.shape
+        k, n = states.shape[2], A.shape[-1]
+        params = [
+            t.detach().float().requires_grad_()
+            for t in (dt_projs_weight, dt_projs_bias, A.view(k, d, n), D.view(k, d))
+        ]
+        dparams = [torch.zeros_like(t) for t in params]
+        dy = dy.unsqueeze(1)
+        with autocast_disabled(x.device):
+            dx, dx_dbl = x.new_zeros((b, l, d), dtype=torch.float), torch.zeros_like(x_dbl)  # dx sums K directions
+            dh = torch.zeros_like(states[0])
+            for j in reversed(range(len(states))):
+                c = CrossSelectiveScanTorch.chunksize
+                idx = index[:, j * c:(j + 1) * c]
+                u = CrossSelectiveScanTorch._gather(x, idx).float().requires_grad_()
+                xd = CrossSelectiveScanTorch._gather(x_dbl, idx).float().requires_grad_()
+                h = states[j].detach().requires_grad_()
+                with torch.enable_grad():
+                    ys, h_last = cross_selective_scan_chunk(u, xd, *params, h, ctx.delta_softplus)
+                    du, dxd, *dp, dh = torch.autograd.grad(
+                        (ys, h_last), (u, xd, *params, h), (CrossSelectiveScanTorch._gather(dy, idx).float(), dh)
+                    )
+                for t, g in zip(dparams, dp):
+                    t += g
+                CrossSelectiveScanTorch._scatter(dx, idx, du)
+                idx = idx.view(1, k, 1, -1).expand(b, k, x_dbl.shape[2], idx.shape[1])
+                dx_dbl.scatter_add_(3, idx, dxd.permute(1, 2, 3, 0).to(dx_dbl.dtype))
+        dW, db = dparams[0].to(dt_projs_weight.dtype), dparams[1].to(dt_projs_bias.dtype)
+        dA, dD = dparams[2].view(A.shape).to(A.dtype), dparams[3].view(D.shape).to(D.dtype)
+        return dx.transpose(1, 2).to(x.dtype), dx_dbl, dW, db, dA, dD, None, None, None
+
+
 def cross_selective_scan(
         x: torch.Tensor = None,
         x_proj_weight: torch.Tensor = None,
@@ -155,29 +527,77 @@ def cross_selective_scan(
         force_fp32=False,  # False if ssoflex
         ssoflex=True,
         SelectiveScan=None,
-        scan_mode_type='default'
+        scan_mode_type="cross",  # see SCAN_MODES
+        As: torch.Tensor = None,  # precomputed -exp(A_logs) of fused models
+        x_proj: Callable = None,  # replaces the x_proj_weight einsum, maps (B, D, L) to (B, K * (R + 2 * N), L)
 ):
     # out_norm: whatever fits (B, L, C); LayerNorm; Sigmoid; Softmax(dim=1);...
 
     B, D, H, W = x.shape
-    D, N = A_logs.shape
     K, D, R = dt_projs_weight.shape
     L = H * W
+    if As is None:
+        As = -torch.exp(A_logs.to(torch.float))  # (k * c, d_state)
+    index = cross_scan_index(H, W, x.device, scan_mode_type)
+    assert index.shape[0] == K, f"scan mode '{scan_mode_type}' needs {index.shape[0]} directions, got {K}"
 
     def selective_scan(u, delta, A, B, C, D=None, delta_bias=None, delta_softplus=True):
         return SelectiveScan.apply(u, delta, A, B, C, D, delta_bias, delta_softplus, nrows, backnrows, ssoflex)
 
-    xs = CrossScan.apply(x)
+    x_dbl = None if x_proj is None else x_proj(x.flatten(2, 3)).view(B, K, -1, L)  # pointwise, before the gather
+    if SelectiveScan is SelectiveScanTorch:  # copy-free path, directions are gathered chunk by chunk
+        if x_dbl is None:
+            x_dbl = torch.einsum("b d l, k c d -> b k c l", x.flatten(2, 3), x_proj_weight)
+        if x_proj_bias is not None:
+            x_dbl = x_dbl + x_proj_bias.view(1, K, -1, 1)
+        xs = x.flatten(2, 3)
+        if force_fp32:
+            xs, x_dbl = xs.float(), x_dbl.float()
+        y = CrossSelectiveScanTorch.apply(
+            xs, x_dbl, dt_projs_weight, dt_projs_bias, As, Ds, index, delta_softplus, torch.is_grad_enabled()
+        )
+    else:  # traced exports gather every mode through `index`, `CrossScan` is an autograd Function
+        cross = scan_mode_type == "cross" and SelectiveScan is not SelectiveScanExport and x_dbl is None
+        y = cross_selective_scan_kernel(
+            x, x_proj_weight, x_proj_bias, dt_projs_weight, dt_projs_bias, As, Ds, delta_softplus, force_fp32,
+            selective_scan, None if cross else index, x_dbl
+        )
+
+    if out_norm_shape in ["v1"]:  # (B, C, H, W)
+        y = out_norm(y.view(B, -1, H, W)).permute(0, 2, 3, 1)  # (B, H, W, C)
+    else:  # (B, L, C)
+        y = y.transpose(dim0=1, dim1=2).contiguous()  # (B, L, C)
+        y = out_norm(y).view(B, H, W, -1)
+
+    return (y.to(x.dtype) if to_dtype else y)
+
+
+def cross_selective_scan_kernel(x, x_proj_weight, x_proj_bias, dt_projs_weight, dt_projs_bias, As, Ds,
+                                delta_softplus, force_fp32, selective_scan, index=None, x_dbl=None):
+    """
+    Cross selective scan for kernels that need contiguous (B, K * D, L) input.
 
-    x_dbl = torch.einsum("b k d l, k c d -> b k c l", xs, x_proj_weight)
+    Directions are materialized by `CrossScan`/`CrossMerge`, or gathered through the `index` table of `cross_scan_index`
+    and its inverse permutation for the other scan modes and for traced exports. A row-major `x_dbl` (B, K, C, L)
+    computed by an `x_proj` module is gathered the same way instead of projecting the gathered directions.
+    """
+    B, D, H, W = x.shape
+    D, N = As.shape
+    K, D, R = dt_projs_weight.shape
+    L = H * W
+
+    xs = CrossScan.apply(x) if index is None else x.flatten(2, 3)[:, :, index].transpose(1, 2).contiguous()
+
+    if x_dbl is None:
+        x_dbl = torch.einsum("b k d l, k c d -> b k c l", xs, x_proj_weight)
+    else:
+        x_dbl = torch.gather(x_dbl, 3, index.view(1, K, 1, L).expand(B, K, x_dbl.shape[2], L))
     if x_proj_bias is not None:
         x_dbl = x_dbl + x_proj_bias.view(1, K, -1, 1)
     dts, Bs, Cs = torch.split(x_dbl, [R, N, N], dim=2)
     dts = torch.einsum("b k r l, k d r -> b k d l", dts, dt_projs_weight)
     xs = xs.view(B, -1, L)
     dts = dts.contiguous().view(B, -1, L)
-    # HiPPO matrix
-    As = -torch.exp(A_logs.to(torch.float))  # (k * c, d_state)
     Bs = Bs.contiguous()
     Cs = Cs.contiguous()
     Ds = Ds.to(torch.float)  # (K * c)
@@ -193,12 +613,7 @@ def cross_selective_scan(
         xs, dts, As, Bs, Cs, Ds, delta_bias, delta_softplus
     ).view(B, K, -1, H, W)
 
-    y: torch.Tensor = CrossMerge.apply(ys)
-
-    if out_norm_shape in ["v1"]:  # (B, C, H, W)
-        y = out_norm(y.view(B, -1, H, W)).permute(0, 2, 3, 1)  # (B, H, W, C)
-    else:  # (B, L, C)
-        y = y.transpose(dim0=1, dim1=2).contiguous()  # (B, L, C)
-        y = out_norm(y).view(B, H, W, -1)
-
-    return (y.to(x.dtype) if to_dtype else y)
\ No newline at end of file
+    if index is None:
+        return CrossMerge.apply(ys)
+    inverse = index.argsort(dim=1).view(1, K, 1, L).expand(B, K, ys.shape[2], L)  # scan step of each position
+    return torch.gather(ys.flatten(3, 4), 3, inverse).sum(1)
\ No newline at end of file
@@ -1,9 +1,84 @@
+from torch.utils.checkpoint import checkpoint
+
+from ultralytics.utils.torch_utils import fuse_conv_and_bn
+
 from .common_utils_mbyolo import *
 
 __all__ = ("VSSBlock", "SimpleStem", "VisionClueMerge", "XSSBlock")
 
 
+def fuse_sequential(seq):
+    """Fold every Conv2d-BatchNorm2d pair of an nn.Sequential into a single Conv2d."""
+    layers = list(seq)
+    fused = []
+    for m in layers:
+        if isinstance(m, nn.BatchNorm2d) and fused and isinstance(fused[-1], nn.Conv2d):
+            fused[-1] = fuse_conv_and_bn(fused[-1], m)
+        else:
+            fused.append(m)
+    return nn.Sequential(*fused)
+
+
+def fuse_norm_and_conv(norm, conv):
+    """Fold the affine transform of LayerNorm2d `norm` into the following 1x1 Conv2d `conv`, return the new conv."""
+    if norm.norm.weight is None or conv.kernel_size != (1, 1) or conv.groups != 1:
+        return conv
+    fusedconv = nn.Conv2d(conv.in_channels, conv.out_channels, kernel_size=1, bias=True).requires_grad_(False)
+    fusedconv = fusedconv.to(conv.weight.device)
+    w = conv.weight.view(conv.out_channels, -1)
+    b = torch.zeros(conv.out_channels, device=w.device) if conv.bias is None else conv.bias
+    fusedconv.weight.copy_((w * norm.norm.weight).view_as(conv.weight))
+    fusedconv.bias.copy_(b + w @ norm.norm.bias)
+    norm.norm.weight, norm.norm.bias = None, None  # normalization only
+    return fusedconv
+
+
+def to_channels_last(x):
+    """Return `x` in channels-last memory format and whether the caller's contiguous layout must be restored."""
+    if x.is_contiguous(memory_format=torch.channels_last):
+        return x, False
+    return x.contiguous(memory_format=torch.channels_last), True
+
+
+def window_partition(x, window_size, shift=0):
+    """
+    Split a (B, C, H, W) map into (B * nH * nW, C, window_size, window_size) tiles.
+
+    The map is zero-padded by `shift` on the top and left, which offsets the window grid for shifted windows, and up to
+    a multiple of `window_size` on the bottom and right. Returns the tiles and the (nH, nW) window grid.
+    """
+    B, C, H, W = x.shape
+    ph, pw = -(H + shift) % window_size, -(W + shift) % window_size
+    x = F.pad(x, (shift, pw, shift, ph))
+    nh, nw = (H + shift + ph) // window_size, (W + shift + pw) // window_size
+    x = x.view(B, C, nh, window_size, nw, window_size).permute(0, 2, 4, 1, 3, 5)
+    return x.reshape(-1, C, window_size, window_size), (nh, nw)
+
+
+def window_reverse(y, grid, H, W, shift=0):
+    """Merge (B * nH * nW, ws, ws, C) tiles from `window_partition` back into a (B, H, W, C) map."""
+    (nh, nw), ws, C = grid, y.shape[1], y.shape[-1]
+    y = y.view(-1, nh, nw, ws, ws, C).permute(0, 1, 3, 2, 4, 5).reshape(-1, nh * ws, nw * ws, C)
+    return y[:, shift:shift + H, shift:shift + W]
+
+
+def checkpoint_branch(fn, x, enabled=False):
+    """
+    Run `fn(x)`, recomputing its activations during backward instead of storing them when `enabled`.
+
+    Only the BatchNorm-free SS2D and MLP branches are routed through here, so the recomputation never updates running
+    statistics twice.
+    """
+    if enabled and torch.is_grad_enabled():
+        return checkpoint(fn, x, use_reentrant=False)
+    return fn(x)
+
+
 class SS2D(nn.Module):
+    scan_mode, window_size, shift, scan_backend, precision = "cross", 0, 0, None, "fp32"  # defaults for old pickles
+    export = False  # set by Exporter, scans with traceable standard ops
+    _scan_cache = None  # (parameter versions, fp32 scan parameters) of eval-mode forwards, see scan_params()
+
     def __init__(
             self,
             # basic dims ===========
@@ -21,10 +96,21 @@ class SS2D(nn.Module):
             bias=False,
             # ======================
             forward_type="v2",
+            scan_mode="cross",
+            window_size=0,
+            shift_window=False,
+            scan_backend=None,
+            precision="fp32",
             **kwargs,
     ):
         """
         ssm_rank_ratio would be used in the future...
+        scan_mode selects the scan directions, one of SCAN_MODES: "cross", "bidi", "unidi" or "snake".
+        window_size > 0 scans independent window_size x window_size tiles as a batch instead of the whole map, offset
+        by half a window when shift_window is set.
+        scan_backend names the selective scan implementation, see `get_selective_scan`; None resolves it on first call.
+        precision is one of SCAN_PRECISIONS: "fp32" upcasts the scan inputs while training, "mixed" keeps them in the
+        autocast dtype and only carries the scan state in fp32, halving scan traffic and saved activations under AMP.
         """
         factory_kwargs = {"device": None, "dtype": None}
         super().__init__()
@@ -33,7 +119,18 @@ class SS2D(nn.Module):
         self.dt_rank = math.ceil(d_model / 16) if dt_rank == "auto" else dt_rank
         self.d_state = math.ceil(d_model / 6) if d_state == "auto" else d_state  # 20240109
         self.d_conv = d_conv
-        self.K = 4
+        if scan_mode not in SCAN_MODES:
+            raise ValueError(f"Unknown scan_mode '{scan_mode}', choose from {list(SCAN_MODES)}")
+        self.scan_mode = scan_mode
+        self.K = SCAN_MODES[scan_mode]
+        self.window_size = window_size
+        self.shift = window_size // 2 if shift_window else 0
+        if scan_backend is not None and scan_backend not in SELECTIVE_SCAN_BACKENDS:
+            raise ValueError(f"Unknown scan_backend '{scan_backend}', choose from {list(SELECTIVE_SCAN_BACKENDS)}")
+        self.scan_backend = scan_backend
+        if precision not in SCAN_PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', choose from {list(SCAN_PRECISIONS)}")
+        self.precision = precision
 
         # tags for forward_type ==============================
         def checkpostfix(tag, value):
@@ -50,7 +147,8 @@ class SS2D(nn.Module):
 
         # forward_type debug =======================================
         FORWARD_TYPES = dict(
-            v2=partial(self.forward_corev2, force_fp32=None, SelectiveScan=SelectiveScanCore),
+            v2=partial(self.forward_corev2, force_fp32=None),
+            v2torch=partial(self.forward_corev2, force_fp32=None, SelectiveScan=SelectiveScanTorch),
         )
         self.forward_core = FORWARD_TYPES.get(forward_type, FORWARD_TYPES.get("v2", None))
 
@@ -155,25 +253,105 @@ class SS2D(nn.Module):
         D._no_weight_decay = True
         return D
 
-    def forward_corev2(self, x: torch.Tensor, channel_first=False, SelectiveScan=SelectiveScanCore,
+    def forward_corev2(self, x: torch.Tensor, channel_first=False, SelectiveScan=None,
                        cross_selective_scan=cross_selective_scan, force_fp32=None):
-        force_fp32 = (self.training and (not self.disable_force32)) if force_fp32 is None else force_fp32
+        if force_fp32 is None:
+            force_fp32 = self.training and not self.disable_force32 and self.precision == "fp32"
+        if self.export:
+            SelectiveScan = SelectiveScanExport
+        elif SelectiveScan is None or SelectiveScan is SelectiveScanCore:  # SelectiveScanCore is bound by older pickles
+            SelectiveScan = get_selective_scan(self.scan_backend, x.device.type)
         if not channel_first:
             x = x.permute(0, 3, 1, 2).contiguous()
         if self.ssm_low_rank:
             x = self.in_rank(x)
+        B, _, H, W = x.shape
+        windowed = self.window_size > 0 and (H > self.window_size or W > self.window_size)
+        if windowed:
+            x, grid = window_partition(x, self.window_size, self.shift)
+        As, Ds, dt_projs_bias = self.scan_params()
         x = cross_selective_scan(
-            x, self.x_proj_weight, None, self.dt_projs_weight, self.dt_projs_bias,
-            self.A_logs, self.Ds,
+            x, getattr(self, "x_proj_weight", None), None, self.dt_projs_weight, dt_projs_bias,
+            getattr(self, "A_logs", None), Ds,
             out_norm=getattr(self, "out_norm", None),
             out_norm_shape=getattr(self, "out_norm_shape", "v0"),
             delta_softplus=True, force_fp32=force_fp32,
             SelectiveScan=SelectiveScan, ssoflex=self.training,  # output fp32
+            As=As, scan_mode_type=self.scan_mode, x_proj=getattr(self, "x_proj", None),
         )
+        if windowed:
+            x = window_reverse(x, grid, H, W, self.shift)
         if self.ssm_low_rank:
             x = self.out_rank(x)
         return x
 
+    def scan_params(self):
+        """
+        Return the fp32 (As, Ds, dt_projs_bias) the scan consumes, As None while it is computed from A_logs.
+
+        In eval mode without gradients to the parameters they are derived once and cached, keyed on the version
+        counters and storage of the parameters so that in-place updates are picked up. `train()`, `.to()` and
+        `load_state_dict()` drop the cache. Fused models hold them as buffers already.
+        """
+        if hasattr(self, "As"):
+            return self.As, self.Ds, self.dt_projs_bias
+        params = (self.A_logs, self.Ds, self.dt_projs_bias)
+        if self.training or (torch.is_grad_enabled() and any(p.requires_grad for p in params)):
+            return None, self.Ds, self.dt_projs_bias
+        key = tuple((p._version, p.data_ptr()) for p in params)
+        if self._scan_cache is None or self._scan_cache[0] != key:
+            with torch.no_grad():
+                As, Ds, dt_projs_bias = -torch.exp(self.A_logs.float()), self.Ds.float(), self.dt_projs_bias.float()
+            self._scan_cache = key, (As, Ds, dt_projs_bias)
+        return self._scan_cache[1]
+
+    def train(self, mode=True):
+        """Set training mode and drop the eval-mode scan parameter cache."""
+        self._scan_cache = None
+        return super().train(mode)
+
+    def _apply(self, fn, *args, **kwargs):
+        """Drop the scan parameter cache when parameters are moved or cast, e.g. by `.to()` or `.half()`."""
+        self._scan_cache = None
+        return super()._apply(fn, *args, **kwargs)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        """Drop the scan parameter cache when a state dict is loaded."""
+        self._scan_cache = None
+        super()._load_from_state_dict(*args, **kwargs)
+
+    def __getstate__(self):
+        """Pickle and deepcopy without the scan parameter cache."""
+        state = self.__dict__.copy()
+        state.pop("_scan_cache", None)
+        return state
+
+    def fuse(self):
+        """Replace A_logs, Ds and dt_projs_bias with the fp32 buffers the scan consumes, for inference."""
+        if hasattr(self, "As"):
+            return
+        with torch.no_grad():
+            As, Ds, dt_projs_bias = -torch.exp(self.A_logs.float()), self.Ds.float(), self.dt_projs_bias.float()
+        del self.A_logs, self.Ds, self.dt_projs_bias
+        self.register_buffer("As", As)
+        self.register_buffer("Ds", Ds)
+        self.register_buffer("dt_projs_bias", dt_projs_bias)
+
+    def cost(self, shape):
+        """
+        Analytic cost of the scan for an input of `shape` (B, C, H, W), see `selective_scan_cost`.
+
+        Child modules (projections, depthwise conv, out_norm) are left to the profiler that walks them; windowed scans
+        are costed on the padded tiles they actually run on.
+        """
+        B, _, H, W = shape
+        ws = self.window_size
+        if ws > 0 and (H > ws or W > ws):
+            nh, nw = math.ceil((H + self.shift) / ws), math.ceil((W + self.shift) / ws)
+            B, H, W = B * nh * nw, ws, ws
+        K, D, _ = self.dt_projs_weight.shape
+        return selective_scan_cost(B, K, D, self.d_state, H * W, self.dt_rank, CrossSelectiveScanTorch.chunksize)
+
     def forward(self, x: torch.Tensor, **kwargs):
         x = self.in_proj(x)
         if not self.disable_z:
@@ -184,7 +362,7 @@ class SS2D(nn.Module):
             x = self.conv2d(x)  # (b, d, h, w)
         x = self.act(x)
         y = self.forward_core(x, channel_first=(self.d_conv > 1))
-        y = y.permute(0, 3, 1, 2).contiguous()
+        y = y.permute(0, 3, 1, 2)  # channels-last view, consumed by the gating product and out_proj without a copy
         if not self.disable_z:
             y = y * z1
         out = self.dropout(self.out_proj(y))
@@ -227,15 +405,24 @@ class LSBlock(nn.Module):
     def forward(self, x):
         input = x
         x = self.fc1(x)
-        x = self.norm(x)
+        if hasattr(self, "norm"):
+            x = self.norm(x)
         x = self.fc2(x)
         x = self.act(x)
         x = self.fc3(x)
         x = input + self.drop(x)
         return x
 
+    def fuse(self):
+        """Fold the BatchNorm2d into the depthwise fc1 convolution."""
+        if hasattr(self, "norm"):
+            self.fc1 = fuse_conv_and_bn(self.fc1, self.norm)
+            delattr(self, "norm")
+
 
 class XSSBlock(nn.Module):
+    use_checkpoint, channels_last = False, False  # defaults for models pickled without them
+
     def __init__(
             self,
             in_channels: int = 0,
@@ -254,6 +441,11 @@ class XSSBlock(nn.Module):
             ssm_conv_bias=True,
             ssm_drop_rate: float = 0,
             ssm_init="v0",
+            ssm_scan_mode="cross",
+            ssm_window_size: int = 0,
+            ssm_shift_window: bool = False,
+            ssm_scan_backend=None,
+            ssm_precision="fp32",
             forward_type="v2",
             # =============================
             mlp_act_layer=nn.GELU,
@@ -261,9 +453,12 @@ class XSSBlock(nn.Module):
             # =============================
             use_checkpoint: bool = False,
             post_norm: bool = False,
+            channels_last: bool = False,
             **kwargs,
     ):
         super().__init__()
+        self.use_checkpoint = use_checkpoint
+        self.channels_last = channels_last
 
         self.in_proj = nn.Sequential(
             nn.Conv2d(in_channels, hidden_dim, kernel_size=1, stride=1, padding=0, bias=False),
@@ -281,7 +476,13 @@ class XSSBlock(nn.Module):
                                          act_layer=ssm_act_layer,
                                          d_conv=ssm_conv,
                                          conv_bias=ssm_conv_bias,
-                                         dropout=ssm_drop_rate, ) for _ in range(n)))
+                                         dropout=ssm_drop_rate,
+                                         forward_type=forward_type,
+                                         scan_mode=ssm_scan_mode,
+                                         window_size=ssm_window_size,
+                                         shift_window=ssm_shift_window and i % 2 == 1,
+                                         scan_backend=ssm_scan_backend,
+                                         precision=ssm_precision, ) for i in range(n)))
         self.drop_path = DropPath(drop_path)
         self.lsblock = LSBlock(hidden_dim, hidden_dim)
         self.mlp_branch = mlp_ratio > 0
@@ -290,19 +491,38 @@ class XSSBlock(nn.Module):
             mlp_hidden_dim = int(hidden_dim * mlp_ratio)
             self.mlp = RGBlock(in_features=hidden_dim, hidden_features=mlp_hidden_dim, act_layer=mlp_act_layer,
                                drop=mlp_drop_rate)
+        if channels_last:
+            self.to(memory_format=torch.channels_last)
 
     def forward(self, input):
+        input, restore = to_channels_last(input) if self.channels_last else (input, False)
         input = self.in_proj(input)
         # ====================
         X1 = self.lsblock(input)
-        input = input + self.drop_path(self.ss2d(self.norm(X1)))
+        ckpt = self.use_checkpoint and self.training
+        input = input + self.drop_path(checkpoint_branch(lambda t: self.ss2d(self.norm(t)), X1, ckpt))
         # ===================
         if self.mlp_branch:
-            input = input + self.drop_path(self.mlp(self.norm2(input)))
-        return input
+            input = input + self.drop_path(checkpoint_branch(lambda t: self.mlp(self.norm2(t)), input, ckpt))
+        return input.contiguous() if restore else input
+
+    def fuse(self):
+        """Fold BatchNorm2d and LayerNorm2d affine parameters into adjacent convolutions for inference."""
+        if isinstance(self.in_proj, nn.Sequential):
+            self.in_proj = fuse_sequential(self.in_proj)
+        self.lsblock.fuse()
+        self.ss2d[0].in_proj = fuse_norm_and_conv(self.norm, self.ss2d[0].in_proj)
+        for m in self.ss2d:
+            m.fuse()
+        if self.mlp_branch:
+            self.mlp.fc1 = fuse_norm_and_conv(self.norm2, self.mlp.fc1)
+        if self.channels_last:
+            self.to(memory_format=torch.channels_last)
 
 
 class VSSBlock(nn.Module):
+    channels_last = False  # default for models pickled without it
+
     def __init__(
             self,
             in_channels: int = 0,
@@ -319,6 +539,11 @@ class VSSBlock(nn.Module):
             ssm_conv_bias=True,
             ssm_drop_rate: float = 0,
             ssm_init="v0",
+            ssm_scan_mode="cross",
+            ssm_window_size: int = 0,
+            ssm_shift_window: bool = False,
+            ssm_scan_backend=None,
+            ssm_precision="fp32",
             forward_type="v2",
             # =============================
             mlp_ratio=4.0,
@@ -327,6 +552,7 @@ class VSSBlock(nn.Module):
             # =============================
             use_checkpoint: bool = False,
             post_norm: bool = False,
+            channels_last: bool = False,
             **kwargs,
     ):
         super().__init__()
@@ -334,6 +560,7 @@ class VSSBlock(nn.Module):
         self.mlp_branch = mlp_ratio > 0
         self.use_checkpoint = use_checkpoint
         self.post_norm = post_norm
+        self.channels_last = channels_last
 
         # proj
         self.proj_conv = nn.Sequential(
@@ -366,6 +593,11 @@ class VSSBlock(nn.Module):
                 initialize=ssm_init,
                 # ==========================
                 forward_type=forward_type,
+                scan_mode=ssm_scan_mode,
+                window_size=ssm_window_size,
+                shift_window=ssm_shift_window,
+                scan_backend=ssm_scan_backend,
+                precision=ssm_precision,
             )
 
         self.drop_path = DropPath(drop_path)
@@ -375,14 +607,30 @@ class VSSBlock(nn.Module):
             mlp_hidden_dim = int(hidden_dim * mlp_ratio)
             self.mlp = RGBlock(in_features=hidden_dim, hidden_features=mlp_hidden_dim, act_layer=mlp_act_layer,
                                drop=mlp_drop_rate, channels_first=False)
+        if channels_last:
+            self.to(memory_format=torch.channels_last)
 
     def forward(self, input: torch.Tensor):
+        input, restore = to_channels_last(input) if self.channels_last else (input, False)
         input = self.proj_conv(input)
         X1 = self.lsblock(input)
-        x = input + self.drop_path(self.op(self.norm(X1)))
+        ckpt = self.use_checkpoint and self.training
+        x = input + self.drop_path(checkpoint_branch(lambda t: self.op(self.norm(t)), X1, ckpt))
         if self.mlp_branch:
-            x = x + self.drop_path(self.mlp(self.norm2(x)))  # FFN
-        return x
+            x = x + self.drop_path(checkpoint_branch(lambda t: self.mlp(self.norm2(t)), x, ckpt))  # FFN
+        return x.contiguous() if restore else x
+
+    def fuse(self):
+        """Fold BatchNorm2d and LayerNorm2d affine parameters into adjacent convolutions for inference."""
+        self.proj_conv = fuse_sequential(self.proj_conv)
+        self.lsblock.fuse()
+        if self.ssm_branch:
+            self.op.in_proj = fuse_norm_and_conv(self.norm, self.op.in_proj)
+            self.op.fuse()
+        if self.mlp_branch:
+            self.mlp.fc1 = fuse_norm_and_conv(self.norm2, self.mlp.fc1)
+        if self.channels_last:
+            self.to(memory_format=torch.channels_last)
 
 
 class SimpleStem(nn.Module):
@@ -401,6 +649,10 @@ class SimpleStem(nn.Module):
     def forward(self, x):
         return self.conv(x)
 
+    def fuse(self):
+        """Fold the BatchNorm2d layers into the convolutions for inference."""
+        self.conv = fuse_sequential(self.conv)
+
 
 class VisionClueMerge(nn.Module):
     def __init__(self, dim, out_dim):
@@ -421,3 +673,7 @@ class VisionClueMerge(nn.Module):
             x[..., 1::2, 1::2]
         ], dim=1)
         return self.pw_linear(y)
+
+    def fuse(self):
+        """Fold the BatchNorm2d layer into the pointwise convolution for inference."""
+        self.pw_linear = fuse_sequential(self.pw_linear)
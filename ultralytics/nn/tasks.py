@@ -58,15 +58,21 @@ from ultralytics.utils.checks import check_requirements, check_suffix, check_yam
 from ultralytics.utils.loss import v8ClassificationLoss, v8DetectionLoss, v8OBBLoss, v8PoseLoss, v8SegmentationLoss
 from ultralytics.utils.plotting import feature_visualization
 from ultralytics.utils.torch_utils import (
+    concurrent_map,
     fuse_conv_and_bn,
     fuse_deconv_and_bn,
+    get_scan_cost,
+    get_thop_custom_ops,
     initialize_weights,
     intersect_dicts,
+    is_state_dict,
     make_divisible,
     model_info,
     scale_img,
     time_sync,
+    TORCH_2_1,
 )
+from ultralytics.utils.weights import load_weights
 
 try:
     import thop
@@ -160,16 +166,21 @@ class BaseModel(nn.Module):
             None
         """
         c = m == self.model[-1] and isinstance(x, list)  # is final layer list, copy input as inplace fix
-        flops = thop.profile(m, inputs=[x.copy() if c else x], verbose=False)[0] / 1e9 * 2 if thop else 0  # GFLOPs
+        ops = get_thop_custom_ops(m)  # analytic selective scan FLOPs
+        flops = thop.profile(m, [x.copy() if c else x], custom_ops=ops, verbose=False)[0] / 1e9 * 2 if thop else 0
+        cost = get_scan_cost(m, x.copy() if c else x)
         t = time_sync()
         for _ in range(10):
             m(x.copy() if c else x)
         dt.append((time_sync() - t) * 100)
         if m == self.model[0]:
-            LOGGER.info(f"{'time (ms)':>10s} {'GFLOPs':>10s} {'params':>10s}  module")
-        LOGGER.info(f"{dt[-1]:10.2f} {flops:10.2f} {m.np:10.0f}  {m.type}")
+            LOGGER.info(
+                f"{'time (ms)':>10s} {'GFLOPs':>10s} {'scan MB':>10s} {'saved MB':>10s} {'params':>10s}  module"
+            )
+        mb = [f"{cost[k] / 2 ** 20:10.2f}" if cost else f"{'-':>10s}" for k in ("bytes", "saved")]
+        LOGGER.info(f"{dt[-1]:10.2f} {flops:10.2f} {' '.join(mb)} {m.np:10.0f}  {m.type}")
         if c:
-            LOGGER.info(f"{sum(dt):10.2f} {'-':>10s} {'-':>10s}  Total")
+            LOGGER.info(f"{sum(dt):10.2f} {'-':>10s} {'-':>10s} {'-':>10s} {'-':>10s}  Total")
 
     def fuse(self, verbose=True):
         """
@@ -194,6 +205,8 @@ class BaseModel(nn.Module):
                 if isinstance(m, RepConv):
                     m.fuse_convs()
                     m.forward = m.forward_fuse  # update forward
+                if isinstance(m, (SimpleStem, VisionClueMerge, VSSBlock, XSSBlock)):
+                    m.fuse()
             self.info(verbose=verbose)
 
         return self
@@ -208,7 +221,7 @@ class BaseModel(nn.Module):
         Returns:
             (bool): True if the number of BatchNorm layers in the model is less than the threshold, False otherwise.
         """
-        bn = tuple(v for k, v in nn.__dict__.items() if "Norm" in k)  # normalization layers, i.e. BatchNorm2d()
+        bn = tuple(v for k, v in nn.__dict__.items() if "BatchNorm" in k)  # foldable normalization, i.e. BatchNorm2d()
         return sum(isinstance(v, bn) for v in self.modules()) < thresh  # True if < 'thresh' BatchNorm layers in model
 
     def info(self, detailed=False, verbose=True, imgsz=640):
@@ -245,16 +258,76 @@ class BaseModel(nn.Module):
         Load the weights into the model.
 
         Args:
-            weights (dict | torch.nn.Module): The pre-trained weights to be loaded.
+            weights (dict | torch.nn.Module): The pre-trained weights, a checkpoint dict, state dict or model.
             verbose (bool, optional): Whether to log the transfer progress. Defaults to True.
         """
-        model = weights["model"] if isinstance(weights, dict) else weights  # torchvision models are not dicts
-        csd = model.float().state_dict()  # checkpoint state_dict as FP32
+        if is_state_dict(weights):
+            csd = {k: v.float() if v.is_floating_point() else v for k, v in weights.items()}
+        else:
+            model = weights["model"] if isinstance(weights, dict) else weights  # torchvision models are not dicts
+            csd = model.float().state_dict()  # checkpoint state_dict as FP32
         csd = intersect_dicts(csd, self.state_dict())  # intersect
         self.load_state_dict(csd, strict=False)  # load
         if verbose:
             LOGGER.info(f"Transferred {len(csd)}/{len(self.model.state_dict())} items from pretrained weights")
 
+    @classmethod
+    def from_weights(cls, weights, *args, verbose=True, **kwargs):
+        """
+        Build `cls(*args, **kwargs)` holding `weights`, without initializing the tensors that the weights replace.
+
+        The module tree is built on the meta device, which allocates nothing and skips random initialization and the
+        stride probe forward, and the checkpoint tensors are then assigned to it without a copy, so the model shares
+        them with `weights`. Strides and other plain tensor attributes are taken from `weights`, from the entries of a
+        state dict named after them, e.g. 'model.22.stride'. Weights that do not cover every parameter and buffer, e.g.
+        of a different class count, fall back to a normal build and `load()`.
+
+        Args:
+            weights (dict | torch.nn.Module): The pre-trained weights, a checkpoint dict, state dict or model.
+            *args (Any): Positional arguments of `cls`, e.g. the model YAML.
+            verbose (bool): Log the model summary and the transfer.
+            **kwargs (Any): Keyword arguments of `cls`.
+
+        Returns:
+            (BaseModel): The model with the weights loaded.
+        """
+        if is_state_dict(weights):
+            model, csd = None, {k: v.float() if v.is_floating_point() else v for k, v in weights.items()}
+        else:
+            model = weights["model"] if isinstance(weights, dict) else weights
+            csd = model.float().state_dict()
+        if TORCH_2_1:
+            with torch.device("meta"):
+                new = cls(*args, verbose=False, **kwargs)
+            sd, attrs = new.state_dict(), {}
+            with contextlib.suppress(AttributeError):  # module tree of weights differs
+                for name, m in new.named_modules():
+                    for k, v in vars(m).items():
+                        if isinstance(v, torch.Tensor) and v.is_meta:
+                            if model is None:
+                                src = csd.pop(f"{name}.{k}" if name else k, None)
+                            else:
+                                src = getattr(model.get_submodule(name), k, None)
+                            if v.numel() == 0:
+                                attrs[name, k] = torch.empty(v.shape, dtype=v.dtype)
+                            elif isinstance(src, torch.Tensor) and src.shape == v.shape:
+                                attrs[name, k] = src.clone()
+                            else:
+                                raise AttributeError(f"no value for {name}.{k}")
+                if sd.keys() == csd.keys() and all(v.shape == csd[k].shape for k, v in sd.items()):
+                    new.load_state_dict(csd, assign=True)
+                    for (name, k), v in attrs.items():
+                        setattr(new.get_submodule(name), k, v)
+                    if hasattr(new, "stride") and hasattr(new.model[-1], "stride"):
+                        new.stride = new.model[-1].stride  # one tensor, as built
+                    if verbose:
+                        new.info()
+                        LOGGER.info(f"Transferred {len(csd)}/{len(sd)} items from pretrained weights")
+                    return new
+        new = cls(*args, verbose=verbose, **kwargs)
+        new.load(weights, verbose)
+        return new
+
     def loss(self, batch, preds=None):
         """
         Compute loss.
@@ -293,7 +366,10 @@ class DetectionModel(BaseModel):
 
         # Build strides
         m = self.model[-1]  # Detect()
-        if isinstance(m, Detect):  # includes all Detect subclasses like Segment, Pose, OBB, WorldDetect
+        if isinstance(m, Detect) and torch.empty(0).is_meta:  # built on the meta device, strides set by from_weights
+            m.inplace = self.inplace
+            self.stride = m.stride
+        elif isinstance(m, Detect):  # includes all Detect subclasses like Segment, Pose, OBB, WorldDetect
             s = 256  # 2x min stride
             m.inplace = self.inplace
             forward = lambda x: self.forward(x)[0] if isinstance(m, (Segment, Pose, OBB)) else self.forward(x)
@@ -324,15 +400,43 @@ class DetectionModel(BaseModel):
         img_size = x.shape[-2:]  # height, width
         s = [1, 0.83, 0.67]  # scales
         f = [None, 3, None]  # flips (2-ud, 3-lr)
-        y = []  # outputs
-        for si, fi in zip(s, f):
-            xi = scale_img(x.flip(fi) if fi else x, si, gs=int(self.stride.max()))
-            yi = super().predict(xi)[0]  # forward
-            yi = self._descale_pred(yi, fi, si, img_size)
-            y.append(yi)
+        xs = [scale_img(x.flip(fi) if fi else x, si, gs=int(self.stride.max())) for si, fi in zip(s, f)]
+        y = [self._descale_pred(yi, fi, si, img_size) for yi, si, fi in zip(self._predict_batched(xs), s, f)]
         y = self._clip_augmented(y)  # clip augmented tails
         return torch.cat(y, -1), None  # augmented inference, train
 
+    def _predict_batched(self, xs):
+        """
+        Return the inference output of the model for each input in `xs`, as separate forwards would.
+
+        Inputs of the same shape are concatenated into one batch. Batches of different shapes run the layers before the
+        head concurrently, in threads with a CUDA stream each on GPU; the head caches per-shape state and runs serially.
+        """
+        groups = {}  # shape -> indices of xs
+        for i, xi in enumerate(xs):
+            groups.setdefault(xi.shape[1:], []).append(i)
+        batches = [torch.cat([xs[i] for i in g]) for g in groups.values()]
+        if len(batches) == 1:
+            features = [self._predict_trunk(batches[0])]
+        else:
+            features = concurrent_map(self._predict_trunk, batches, batches[0].device)
+        y = [None] * len(xs)
+        for g, fg in zip(groups.values(), features):
+            for i, yi in zip(g, self.model[-1](fg)[0].split([len(xs[i]) for i in g])):
+                y[i] = yi
+        return y
+
+    def _predict_trunk(self, x):
+        """Run every layer but the head on `x` and return the inputs of the head."""
+        y = []  # outputs
+        for m in self.model[:-1]:
+            if m.f != -1:  # if not from previous layer
+                x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]  # from earlier layers
+            x = m(x)  # run
+            y.append(x if m.i in self.save else None)  # save output
+        f = self.model[-1].f
+        return x if f == -1 else y[f] if isinstance(f, int) else [x if j == -1 else y[j] for j in f]
+
     @staticmethod
     def _descale_pred(p, flips, scale, img_size, dim=1):
         """De-scale predictions following augmented inference (inverse operation)."""
@@ -658,20 +762,55 @@ class WorldModel(DetectionModel):
 
 
 class Ensemble(nn.ModuleList):
-    """Ensemble of models."""
+    """
+    Ensemble of models.
+
+    Attributes:
+        concurrent (bool): Run the member models concurrently, in threads with a CUDA stream each on GPU, so latency
+            approaches that of the slowest member instead of the sum of all members.
+        fusion (str): How member predictions are merged, 'nms' concatenates them for the NMS that follows, 'wbf'
+            merges the detections of each member by weighted box fusion.
+        fusion_weights (list, optional): Weight of each member for 'wbf', equal weights if None.
+        conf (float): Confidence threshold of the per-member NMS before 'wbf'.
+        iou (float): IoU threshold of the per-member NMS and of box fusion for 'wbf'.
+        max_det (int): Maximum detections per image and member for 'wbf'.
+    """
 
-    def __init__(self):
+    def __init__(self, concurrent=False, fusion="nms", fusion_weights=None, conf=0.001, iou=0.55, max_det=300):
         """Initialize an ensemble of models."""
         super().__init__()
-
-    def forward(self, x, augment=False, profile=False, visualize=False):
-        """Function generates the YOLO network's final layer."""
-        y = [module(x, augment, profile, visualize)[0] for module in self]
+        assert fusion in {"nms", "wbf"}, f"fusion='{fusion}' must be 'nms' or 'wbf'"
+        self.concurrent, self.fusion, self.fusion_weights = concurrent, fusion, fusion_weights
+        self.conf, self.iou, self.max_det = conf, iou, max_det
+
+    def forward(self, x, augment=False, profile=False, visualize=False, embed=None):
+        """Function generates the YOLO network's final layer, `embed` is accepted for AutoBackend and ignored."""
+        if self.concurrent and len(self) > 1:
+            y = concurrent_map(lambda module: module(x, augment, profile, visualize)[0], list(self), x.device)
+        else:
+            y = [module(x, augment, profile, visualize)[0] for module in self]
         # y = torch.stack(y).max(0)[0]  # max ensemble
         # y = torch.stack(y).mean(0)  # mean ensemble
+        if self.fusion == "wbf":
+            return self._fuse_boxes(y), None
         y = torch.cat(y, 2)  # nms ensemble, y shape(B, HW, C)
         return y, None  # inference, train output
 
+    def _fuse_boxes(self, y):
+        """Merge member predictions (B, 4 + nc, A) by weighted box fusion into (B, 4 + nc, N) one-hot predictions."""
+        from ultralytics.utils.ops import non_max_suppression, weighted_boxes_fusion, xyxy2xywh
+
+        assert all(type(m.model[-1]) is Detect for m in self), "weighted box fusion supports detection models only"
+        nc = y[0].shape[1] - 4
+        dets = [non_max_suppression(yi, self.conf, self.iou, max_det=self.max_det, in_place=False) for yi in y]
+        fused = [weighted_boxes_fusion(list(d), self.fusion_weights, self.iou) for d in zip(*dets)]
+        out = y[0].new_zeros((len(fused), 4 + nc, max(len(f) for f in fused)))
+        for i, f in enumerate(fused):
+            n = torch.arange(len(f), device=f.device)
+            out[i, :4, : len(f)] = xyxy2xywh(f[:, :4]).T
+            out[i, 4 + f[:, 5].long(), n] = f[:, 4]
+        return out
+
 
 # Functions ------------------------------------------------------------------------------------------------------------
 
@@ -723,6 +862,7 @@ def torch_safe_load(weight):
     This function attempts to load a PyTorch model with the torch.load() function. If a ModuleNotFoundError is raised,
     it catches the error, logs a warning message, and attempts to install the missing module via the
     check_requirements() function. After installation, the function again attempts to load the model using torch.load().
+    A *.safetensors file is memory-mapped and rebuilt from its YAML sidecar instead, see `ultralytics.utils.weights`.
 
     Args:
         weight (str): The file path of the PyTorch model.
@@ -732,8 +872,10 @@ def torch_safe_load(weight):
     """
     from ultralytics.utils.downloads import attempt_download_asset
 
-    check_suffix(file=weight, suffix=".pt")
+    check_suffix(file=weight, suffix=(".pt", ".safetensors"))
     file = attempt_download_asset(weight)  # search online if missing locally
+    if Path(file).suffix == ".safetensors":
+        return load_weights(file), file
     try:
         with temporary_modules(
                 {
@@ -775,10 +917,13 @@ def torch_safe_load(weight):
     return ckpt, file  # load
 
 
-def attempt_load_weights(weights, device=None, inplace=True, fuse=False):
-    """Loads an ensemble of models weights=[a,b,c] or a single model weights=[a] or weights=a."""
+def attempt_load_weights(weights, device=None, inplace=True, fuse=False, **kwargs):
+    """
+    Loads an ensemble of models weights=[a,b,c] or a single model weights=[a] or weights=a.
 
-    ensemble = Ensemble()
+    Keyword arguments are `Ensemble` options, e.g. concurrent=True or fusion='wbf'.
+    """
+    ensemble = Ensemble(**kwargs)
     for w in weights if isinstance(weights, list) else [weights]:
         ckpt, w = torch_safe_load(w)  # load ckpt
         args = {**DEFAULT_CFG_DICT, **ckpt["train_args"]} if "train_args" in ckpt else None  # combined args
@@ -866,6 +1011,7 @@ def parse_model(d, ch, verbose=True):  # model_dict, input_channels(3)
     layers, save, c2 = [], [], ch[-1]  # layers, savelist, ch out
     for i, (f, n, m, args) in enumerate(d["backbone"] + d["head"]):  # from, number, module, args
         m = getattr(torch.nn, m[3:]) if "nn." in m else globals()[m]  # get module
+        kwargs = args.pop() if args and isinstance(args[-1], dict) else {}  # trailing dict of keyword arguments
         for j, a in enumerate(args):
             if isinstance(a, str):
                 with contextlib.suppress(ValueError):
@@ -942,12 +1088,16 @@ def parse_model(d, ch, verbose=True):  # model_dict, input_channels(3)
         else:
             c2 = ch[f]
 
-        m_ = nn.Sequential(*(m(*args) for _ in range(n))) if n > 1 else m(*args)  # module
+        if m is VSSBlock and n > 1 and kwargs.get("ssm_shift_window"):  # alternate regular and shifted windows
+            m_ = nn.Sequential(*(m(*args, **{**kwargs, "ssm_shift_window": i % 2 == 1}) for i in range(n)))
+        else:
+            m_ = nn.Sequential(*(m(*args, **kwargs) for _ in range(n))) if n > 1 else m(*args, **kwargs)  # module
         t = str(m)[8:-2].replace("__main__.", "")  # module type
-        m.np = sum(x.numel() for x in m_.parameters())  # number params
+        m_.np = sum(x.numel() for x in m_.parameters())  # number params
         m_.i, m_.f, m_.type = i, f, t  # attach index, 'from' index, type
         if verbose:
-            LOGGER.info(f"{i:>3}{str(f):>20}{n_:>3}{m.np:10.0f}  {t:<45}{str(args):<30}")  # print
+            a = args + [kwargs] if kwargs else args
+            LOGGER.info(f"{i:>3}{str(f):>20}{n_:>3}{m_.np:10.0f}  {t:<45}{str(a):<30}")  # print
         save.extend(x % i for x in ([f] if isinstance(f, int) else f) if x != -1)  # append to savelist
         layers.append(m_)
         if i == 0:
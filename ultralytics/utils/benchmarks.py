@@ -3,8 +3,9 @@
 Benchmark a YOLO model formats for speed and accuracy.
 
 Usage:
-    from ultralytics.utils.benchmarks import ProfileModels, benchmark
+    from ultralytics.utils.benchmarks import ProfileModels, ProfileSelectiveScan, benchmark
     ProfileModels(['yolov8n.yaml', 'yolov8s.yaml']).profile()
+    ProfileSelectiveScan(imgsz=(32, 64), save='scan.json').profile()
     benchmark(model='yolov8n.pt', imgsz=160)
 
 Format                  | `format=argument`         | Model
@@ -25,6 +26,9 @@ NCNN                    | `ncnn`                    | yolov8n_ncnn_model/
 """
 
 import glob
+import itertools
+import json
+import math
 import os
 import platform
 import re
@@ -524,3 +528,264 @@ class ProfileModels:
         print(separator)
         for row in table_rows:
             print(row)
+
+
+class ProfileSelectiveScan:
+    """
+    ProfileSelectiveScan class for microbenchmarking the selective scan and the Mamba-YOLO modules built on it.
+
+    Every combination of target, backend, dtype, batch, channels, d_state and image size is timed for the forward pass
+    and for the forward plus backward pass. Latency, throughput, peak memory and the activations saved for backward are
+    written to JSON, and results are compared against a stored baseline JSON to flag regressions.
+
+    Attributes:
+        targets (tuple): Benchmarked callables, any of `ProfileSelectiveScan.TARGETS`.
+        backends (tuple): Names of the selective scan backends to sweep. Defaults to all available on `device`.
+        batch, channels, d_state, imgsz (tuple): Sizes to sweep, `imgsz` is the side of the square feature map.
+        dtype (tuple): Dtypes to sweep, reduced precision runs under autocast.
+        modes (tuple): "forward" (no grad) and/or "backward" (forward plus backward).
+        threshold (float): Relative latency increase over the baseline reported as a regression. Default is 0.1.
+
+    Methods:
+        profile(): Runs the sweep, prints a table and returns the results.
+
+    Example:
+        ```python
+        from ultralytics.utils.benchmarks import ProfileSelectiveScan
+
+        ProfileSelectiveScan(imgsz=(32, 64), save="scan.json").profile()  # store a baseline
+        ProfileSelectiveScan(imgsz=(32, 64), baseline="scan.json").profile()  # flag regressions against it
+        ```
+    """
+
+    TARGETS = ("selective_scan", "cross_selective_scan", "SS2D", "VSSBlock", "XSSBlock")
+
+    def __init__(
+        self,
+        targets=TARGETS,
+        backends=None,
+        batch=(1,),
+        channels=(64,),
+        d_state=(16,),
+        imgsz=(32,),
+        dtype=("float32",),
+        modes=("forward", "backward"),
+        num_timed_runs=10,
+        num_warmup_runs=2,
+        device=None,
+        save=None,
+        baseline=None,
+        threshold=0.1,
+    ):
+        """
+        Initialize the ProfileSelectiveScan class.
+
+        Args:
+            targets (tuple, optional): Callables to benchmark. Default is all of `ProfileSelectiveScan.TARGETS`.
+            backends (tuple, optional): Registered selective scan backend names. Default is every available backend.
+            batch (tuple, optional): Batch sizes to sweep. Default is (1,).
+            channels (tuple, optional): Channel counts to sweep. Default is (64,).
+            d_state (tuple, optional): SSM state sizes to sweep. Default is (16,).
+            imgsz (tuple, optional): Feature map sides to sweep, the scan length is imgsz ** 2. Default is (32,).
+            dtype (tuple, optional): Dtype names to sweep, i.e. "float32", "bfloat16", "float16". Default is float32.
+            modes (tuple, optional): Passes to time, "forward" and/or "backward". Default is both.
+            num_timed_runs (int, optional): Number of timed runs per configuration. Default is 10.
+            num_warmup_runs (int, optional): Number of warmup runs before timing. Default is 2.
+            device (torch.device, optional): Device used for profiling. If None, it is determined automatically.
+            save (str | Path, optional): JSON file the results are written to.
+            baseline (str | Path, optional): JSON file of an earlier run to compare latencies against.
+            threshold (float, optional): Relative slowdown over the baseline flagged as a regression. Default is 0.1.
+        """
+        from ultralytics.nn.modules.common_utils_mbyolo import SELECTIVE_SCAN_BACKENDS, selective_scan_available
+
+        self.device = torch.device(device) if device is not None else select_device("", verbose=False)
+        if backends is None:
+            backends = tuple(k for k in SELECTIVE_SCAN_BACKENDS if selective_scan_available(k, self.device.type))
+        self.targets = targets
+        self.backends = backends
+        self.batch = batch
+        self.channels = channels
+        self.d_state = d_state
+        self.imgsz = imgsz
+        self.dtype = dtype
+        self.modes = modes
+        self.num_timed_runs = num_timed_runs
+        self.num_warmup_runs = num_warmup_runs
+        self.save = save
+        self.baseline = baseline
+        self.threshold = threshold
+
+    def profile(self):
+        """Benchmarks every configuration, compares it to the baseline if given, saves and returns the results."""
+        configs = list(
+            itertools.product(
+                self.targets, self.backends, self.dtype, self.batch, self.channels, self.d_state, self.imgsz, self.modes
+            )
+        )
+        results = []
+        for target, backend, dtype, b, c, n, s, mode in TQDM(configs, desc="Profiling selective scan"):
+            result = dict(
+                target=target, backend=backend, mode=mode, dtype=dtype, batch=b, channels=c, d_state=n, imgsz=s
+            )
+            try:
+                result.update(self.profile_one(target, backend, getattr(torch, dtype), b, c, n, s, mode))
+            except Exception as e:  # i.e. dtype not supported on this device
+                result["error"] = f"{type(e).__name__}: {e}"
+            results.append(result)
+
+        if self.baseline:
+            self.compare(results, json.loads(Path(self.baseline).read_text())["results"], self.threshold)
+        self.print_table(results)
+        if self.save:
+            meta = dict(device=str(self.device), torch=torch.__version__, platform=platform.platform())
+            Path(self.save).write_text(json.dumps({**meta, "results": results}, indent=2))
+        return results
+
+    def build(self, target, backend, b, c, n, s):
+        """Returns a callable for `target` on the selective scan `backend` and the inputs it is called with."""
+        from torch import nn
+
+        from ultralytics.nn.modules.common_utils_mbyolo import SELECTIVE_SCAN_BACKENDS, cross_selective_scan
+        from ultralytics.nn.modules.mamba_yolo import SS2D, VSSBlock, XSSBlock
+
+        device, k, r, L = self.device, 4, math.ceil(c / 16), s * s
+        scan = SELECTIVE_SCAN_BACKENDS[backend][0]
+        if target == "selective_scan":
+            inputs = [
+                torch.randn(b, k * c, L, device=device),  # u
+                torch.rand(b, k * c, L, device=device) * 0.1,  # delta
+                -torch.rand(k * c, n, device=device),  # A
+                torch.randn(b, k, n, L, device=device),  # B
+                torch.randn(b, k, n, L, device=device),  # C
+                torch.randn(k * c, device=device),  # D
+                torch.randn(k * c, device=device),  # delta_bias
+            ]
+            return lambda *x: scan.apply(*x, True, 1, 1, True), inputs
+        if target == "cross_selective_scan":
+            inputs = [
+                torch.randn(b, c, s, s, device=device),  # x
+                torch.randn(k, r + 2 * n, c, device=device) * c**-0.5,  # x_proj_weight
+                torch.randn(k, c, r, device=device) * r**-0.5,  # dt_projs_weight
+                torch.randn(k, c, device=device),  # dt_projs_bias
+                torch.randn(k * c, n, device=device),  # A_logs
+                torch.randn(k * c, device=device),  # Ds
+            ]
+            return lambda x, xw, dw, db, a, d: cross_selective_scan(
+                x, xw, None, dw, db, a, d, out_norm=nn.Identity(), SelectiveScan=scan
+            ), inputs
+        if target == "SS2D":
+            model = SS2D(d_model=c, d_state=n, scan_backend=backend)
+        else:
+            model = {"VSSBlock": VSSBlock, "XSSBlock": XSSBlock}[target](c, c, ssm_d_state=n, ssm_scan_backend=backend)
+        return model.to(device), [torch.randn(b, c, s, s, device=device)]
+
+    def profile_one(self, target, backend, dtype, b, c, n, s, mode):
+        """Times one configuration and returns its latency, throughput and memory statistics."""
+        fn, inputs = self.build(target, backend, b, c, n, s)
+        backward = mode == "backward"
+        inputs = [x.requires_grad_(backward) for x in inputs]
+        cuda = self.device.type == "cuda"
+
+        def run():
+            with torch.set_grad_enabled(backward), torch.autocast(
+                self.device.type, dtype=dtype, enabled=dtype != torch.float32
+            ):
+                y = fn(*inputs)
+            if backward:
+                y.float().sum().backward()
+            if cuda:
+                torch.cuda.synchronize(self.device)
+
+        for _ in range(self.num_warmup_runs):
+            run()
+        if cuda:
+            torch.cuda.reset_peak_memory_stats(self.device)
+        run_times = []
+        for _ in range(self.num_timed_runs):
+            t = time.perf_counter()
+            run()
+            run_times.append((time.perf_counter() - t) * 1000)  # milliseconds
+        run_times = ProfileModels.iterative_sigma_clipping(np.array(run_times), sigma=2, max_iters=3)
+        peak = torch.cuda.max_memory_allocated(self.device) if cuda else self.cpu_peak_memory(fn, inputs, run)
+
+        saved = {}
+        if backward:  # storages kept alive for backward by one forward pass
+
+            def pack(x):
+                saved[x.untyped_storage().data_ptr()] = x.untyped_storage().nbytes()
+                return x
+
+            with torch.autograd.graph.saved_tensors_hooks(pack, lambda x: x), torch.autocast(
+                self.device.type, dtype=dtype, enabled=dtype != torch.float32
+            ):
+                fn(*inputs)
+        latency = float(np.mean(run_times))
+        return dict(
+            latency_ms=round(latency, 3),
+            latency_std_ms=round(float(np.std(run_times)), 3),
+            throughput=round(b * 1000 / latency, 2),  # feature maps per second
+            peak_memory_mb=round(peak / 2**20, 2),
+            saved_memory_mb=round(sum(saved.values()) / 2**20, 2) if backward else None,
+        )
+
+    @staticmethod
+    def cpu_peak_memory(fn, inputs, run):
+        """
+        Returns the peak bytes of CPU tensors during one `run()`, like `torch.cuda.max_memory_allocated()` on CUDA.
+
+        The torch profiler records the bytes every op allocates and frees. Their running sum in op order peaks at the
+        memory allocated by the run, to which the inputs, weights and gradients held before the run are added.
+        """
+        held = [*inputs, *(fn.parameters() if isinstance(fn, torch.nn.Module) else [])]
+        held += [x.grad for x in held if x.grad is not None]
+        if isinstance(fn, torch.nn.Module):
+            held += list(fn.buffers())
+        current = peak = sum({x.untyped_storage().data_ptr(): x.untyped_storage().nbytes() for x in held}.values())
+        with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], profile_memory=True) as prof:
+            run()
+        for event in sorted(prof.events(), key=lambda e: e.time_range.start):
+            current += event.self_cpu_memory_usage
+            peak = max(peak, current)
+        return peak
+
+    @staticmethod
+    def key(result):
+        """Returns the string identifying the configuration of a result."""
+        keys = ("target", "backend", "mode", "dtype", "batch", "channels", "d_state", "imgsz")
+        return "/".join(str(result[k]) for k in keys)
+
+    @staticmethod
+    def compare(results, baseline, threshold=0.1):
+        """Adds baseline latencies to `results` and flags configurations more than `threshold` slower."""
+        baseline = {ProfileSelectiveScan.key(r): r for r in baseline if "latency_ms" in r}
+        for r in results:
+            base = baseline.get(ProfileSelectiveScan.key(r))
+            if base is None or "latency_ms" not in r:
+                continue
+            r["baseline_ms"] = base["latency_ms"]
+            r["regression"] = r["latency_ms"] > base["latency_ms"] * (1 + threshold)
+            if r["regression"]:
+                LOGGER.warning(
+                    f"WARNING ⚠️ {ProfileSelectiveScan.key(r)} regressed {base['latency_ms']:.2f} -> "
+                    f"{r['latency_ms']:.2f} ms"
+                )
+
+    @staticmethod
+    def print_table(results):
+        """Prints a table of benchmark results."""
+        header = ["config", "latency (ms)", "baseline (ms)", "throughput (/s)", "peak (MB)", "saved (MB)"]
+        print(f"\n| {' | '.join(header)} |")
+        print(f"|{'|'.join('-' * (len(h) + 2) for h in header)}|")
+        for r in results:
+            if "error" in r:
+                print(f"| {ProfileSelectiveScan.key(r)} | {r['error']} |")
+                continue
+            row = [
+                ProfileSelectiveScan.key(r),
+                f"{r['latency_ms']:.2f} ± {r['latency_std_ms']:.2f}",
+                f"{r['baseline_ms']:.2f}{' ⚠️' if r['regression'] else ''}" if "baseline_ms" in r else "-",
+                f"{r['throughput']:.1f}",
+                "-" if r["peak_memory_mb"] is None else f"{r['peak_memory_mb']:.1f}",
+                "-" if r["saved_memory_mb"] is None else f"{r['saved_memory_mb']:.2f}",
+            ]
+            print(f"| {' | '.join(row)} |")
@@ -47,6 +47,11 @@ def on_train_batch_end(trainer):
     pass
 
 
+def on_train_telemetry(trainer):
+    """Called every telemetry window of training steps, with the rolling step phase times in trainer.step_times."""
+    pass
+
+
 def on_train_epoch_end(trainer):
     """Called at the end of each training epoch."""
     pass
@@ -151,6 +156,7 @@ default_callbacks = {
     "optimizer_step": [optimizer_step],
     "on_before_zero_grad": [on_before_zero_grad],
     "on_train_batch_end": [on_train_batch_end],
+    "on_train_telemetry": [on_train_telemetry],
     "on_train_epoch_end": [on_train_epoch_end],
     "on_fit_epoch_end": [on_fit_epoch_end],  # fit = train + val
     "on_model_save": [on_model_save],
@@ -164,25 +164,36 @@ class v8DetectionLoss:
 
         self.use_dfl = m.reg_max > 1
 
-        self.assigner = TaskAlignedAssigner(topk=10, num_classes=self.nc, alpha=0.5, beta=6.0)
+        self.assigner = TaskAlignedAssigner(
+            topk=10, num_classes=self.nc, alpha=0.5, beta=6.0, chunk=getattr(self.hyp, "assigner_chunk", 0)
+        )
         self.bbox_loss = BboxLoss(m.reg_max - 1, use_dfl=self.use_dfl).to(device)
         self.proj = torch.arange(m.reg_max, dtype=torch.float, device=device)
 
     def preprocess(self, targets, batch_size, scale_tensor):
         """Preprocesses the target counts and matches with the input batch size to output a tensor."""
-        if targets.shape[0] == 0:
-            out = torch.zeros(batch_size, 0, 5, device=self.device)
-        else:
-            i = targets[:, 0]  # image index
-            _, counts = i.unique(return_counts=True)
-            counts = counts.to(dtype=torch.int32)
-            out = torch.zeros(batch_size, counts.max(), 5, device=self.device)
-            for j in range(batch_size):
-                matches = i == j
-                n = matches.sum()
-                if n:
-                    out[j, :n] = targets[matches, 1:]
-            out[..., 1:5] = xywh2xyxy(out[..., 1:5].mul_(scale_tensor))
+        out = self.pack(targets, batch_size)
+        out[..., 1:5] = xywh2xyxy(out[..., 1:5].mul_(scale_tensor))
+        return out
+
+    @staticmethod
+    def pack(targets, batch_size):
+        """
+        Pack (n, 1 + c) target rows of [image index, ...] into a zero-padded (batch_size, max per image, c) tensor.
+
+        Every row is scattered to its image at its rank among that image's rows, computed from the per-image counts and
+        their cumulative offsets, so the cost does not grow with the batch size. Rows keep their order within an image.
+        """
+        n, c = targets.shape[0], targets.shape[1] - 1
+        if n == 0:
+            return torch.zeros(batch_size, 0, c, device=targets.device, dtype=targets.dtype)
+        i = targets[:, 0].long()  # image index
+        i, order = i.sort(stable=True)
+        counts = torch.bincount(i, minlength=batch_size)
+        offsets = counts.cumsum(0) - counts  # index of the first row of each image
+        rank = torch.arange(n, device=i.device) - offsets[i]
+        out = targets.new_zeros(batch_size, int(counts.max()), c)
+        out[i, rank] = targets[order, 1:]
         return out
 
     def bbox_decode(self, anchor_points, pred_dist):
@@ -605,25 +616,15 @@ class v8OBBLoss(v8DetectionLoss):
         Note model must be de-paralleled.
         """
         super().__init__(model)
-        self.assigner = RotatedTaskAlignedAssigner(topk=10, num_classes=self.nc, alpha=0.5, beta=6.0)
+        self.assigner = RotatedTaskAlignedAssigner(
+            topk=10, num_classes=self.nc, alpha=0.5, beta=6.0, chunk=getattr(self.hyp, "assigner_chunk", 0)
+        )
         self.bbox_loss = RotatedBboxLoss(self.reg_max - 1, use_dfl=self.use_dfl).to(self.device)
 
     def preprocess(self, targets, batch_size, scale_tensor):
         """Preprocesses the target counts and matches with the input batch size to output a tensor."""
-        if targets.shape[0] == 0:
-            out = torch.zeros(batch_size, 0, 6, device=self.device)
-        else:
-            i = targets[:, 0]  # image index
-            _, counts = i.unique(return_counts=True)
-            counts = counts.to(dtype=torch.int32)
-            out = torch.zeros(batch_size, counts.max(), 6, device=self.device)
-            for j in range(batch_size):
-                matches = i == j
-                n = matches.sum()
-                if n:
-                    bboxes = targets[matches, 2:]
-                    bboxes[..., :4].mul_(scale_tensor)
-                    out[j, :n] = torch.cat([targets[matches, 1:2], bboxes], dim=-1)
+        out = self.pack(targets, batch_size)
+        out[..., 1:5].mul_(scale_tensor)
         return out
 
     def __call__(self, preds, batch):
@@ -302,6 +302,44 @@ def non_max_suppression(
     return output
 
 
+def weighted_boxes_fusion(preds, weights=None, iou_thres=0.55, max_wh=7680):
+    """
+    Fuse the detections of several models on one image by weighted box fusion (WBF).
+
+    Every box joins the cluster of the same-class box it overlaps most among those that NMS over all models keeps. A
+    cluster is replaced by the average of its boxes weighted by confidence and model weight, with the summed weighted
+    confidence over the total model weight as score, so that boxes found by only some of the models are down-weighted.
+
+    Args:
+        preds (List[torch.Tensor]): Detections (n, 6) of each model, with columns (x1, y1, x2, y2, confidence, class).
+        weights (List[float], optional): Weight of each model, equal weights if None.
+        iou_thres (float): IoU above which boxes of the same class are fused.
+        max_wh (int): The maximum box width and height in pixels, offsets classes for class-wise NMS.
+
+    Returns:
+        (torch.Tensor): Fused detections (m, 6) sorted by confidence.
+    """
+    import torchvision  # scope for faster 'import ultralytics'
+
+    from ultralytics.utils.metrics import box_iou
+
+    weights = [1.0] * len(preds) if weights is None else weights
+    x = torch.cat(preds)
+    if not x.shape[0]:
+        return x
+    w = torch.cat([x.new_full((len(p),), float(wi)) for p, wi in zip(preds, weights)])
+    boxes, conf, cls = x[:, :4], x[:, 4], x[:, 5]
+    ws = w * conf
+    boxes_c = boxes + cls[:, None] * max_wh  # offset by class so boxes only overlap within a class
+    i = torchvision.ops.nms(boxes_c, ws, iou_thres)  # cluster leaders
+    j = box_iou(boxes_c, boxes_c[i]).argmax(1)  # cluster of every box, each overlaps a leader by more than iou_thres
+    score = ws.new_zeros(len(i)).index_add_(0, j, ws)
+    fused = boxes.new_zeros((len(i), 4)).index_add_(0, j, boxes * ws[:, None]) / score[:, None]
+    total = w.new_zeros(len(i)).index_add_(0, j, w).clamp(min=sum(weights))  # total model weight, or more if repeated
+    x = torch.cat((fused, (score / total)[:, None], cls[i, None]), 1)
+    return x[x[:, 4].argsort(descending=True)]
+
+
 def clip_boxes(boxes, shape):
     """
     Takes a list of bounding boxes and a shape (height, width) and clips the bounding boxes to the shape.
@@ -0,0 +1,176 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""
+Structured channel pruning of Mamba-YOLO blocks.
+
+Removes the least important inner channels of every `VSSBlock` and `XSSBlock`: the SS2D inner width, shared by
+`in_proj`, the depthwise conv, the per-direction `x_proj_weight`, `dt_projs`, `A_logs` and `Ds` rows, `out_norm` and
+`out_proj`, and the `RGBlock` hidden width. Block input and output widths are kept, so the pruned model has the layout
+of the original YAML with smaller `ssm_ratio` and `mlp_ratio` and can be fine-tuned with `YOLO.train`.
+
+Usage:
+    from ultralytics import YOLO
+    from ultralytics.utils.prune import prune_checkpoint
+
+    yaml_file, weights = prune_checkpoint('mamba-yolo.pt', ratio=0.25)
+    YOLO(weights).train(data='coco.yaml', epochs=30)
+"""
+
+import math
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+
+import torch
+
+from ultralytics.utils import LOGGER, colorstr, yaml_save
+from ultralytics.utils.torch_utils import de_parallel, get_num_params, make_divisible
+
+
+def ss2d_importance(m):
+    """Score each SS2D inner channel by the norm of its `out_proj` column scaled by its `out_norm` weight."""
+    return m.out_proj.weight.flatten(1).norm(dim=0) * m.out_norm.weight.abs()
+
+
+def rgblock_importance(m):
+    """Score each RGBlock hidden channel by the norms of its `fc2` column and gating `fc1` row."""
+    h = m.fc2.in_channels
+    return m.fc2.weight.flatten(1).norm(dim=0) * m.fc1.weight[h:].flatten(1).norm(dim=1)
+
+
+def keep_channels(score, n):
+    """Return the sorted indices of the `n` highest scores."""
+    return score.topk(n).indices.sort().values
+
+
+def ratio_for(n, base):
+    """Return the shortest decimal ratio r with int(r * base) == n, as block widths are derived from YAML ratios."""
+    for digits in range(2, 8):
+        for c in n, n + 0.5:
+            r = round(c / base, digits)
+            if int(r * base) == n:
+                return r
+    raise ValueError(f"no ratio yields {n} channels from {base}")
+
+
+def prune_mamba(model, ratio=0.25, divisor=8, verbose=True):
+    """
+    Return a pruned copy of detection `model` with `ratio` of the SS2D and RGBlock inner channels of every Mamba block
+    removed.
+
+    Args:
+        model (nn.Module): Unfused `DetectionModel` built from a YAML.
+        ratio (float): Fraction of inner channels to remove, widths are rounded up to a multiple of `divisor`.
+        divisor (int): Channel multiple of the pruned widths.
+        verbose (bool): Log the parameter counts before and after.
+
+    Returns:
+        (nn.Module): New model built from the pruned YAML in `model.yaml`, holding the kept weights.
+    """
+    from ultralytics.nn.modules.mamba_yolo import SS2D, RGBlock, VSSBlock, XSSBlock
+    from ultralytics.nn.tasks import DetectionModel
+
+    assert 0 <= ratio < 1, f"ratio={ratio} must be in [0, 1)"
+    model = de_parallel(model)
+    assert not any(hasattr(m, "As") for m in model.modules()), "prune the unfused training model"
+    cfg = deepcopy(model.yaml)
+    cfg.pop("yaml_file", None)
+    if cfg.get("scales"):  # keep the scale the model was built with, parse_model picks the first one otherwise
+        scale = cfg.get("scale") or next(iter(cfg["scales"]))
+        cfg["scale"], cfg["scales"] = scale, {scale: cfg["scales"][scale]}
+
+    keep = {}  # module -> (kept channel indices, old width)
+    for i, layer in enumerate(model.model):
+        blocks = [m for m in layer.modules() if isinstance(m, (VSSBlock, XSSBlock))]
+        if not blocks:
+            continue
+        kwargs = {}
+        ss2ds = [m for b in blocks for m in b.modules() if isinstance(m, SS2D)]
+        if ss2ds:
+            assert not any(m.ssm_low_rank for m in ss2ds), "low-rank SS2D pruning is not supported"
+            d_model, d = ss2ds[0].in_proj.in_channels, ss2ds[0].out_proj.in_channels
+            n = min(d, make_divisible(d * (1 - ratio), divisor))
+            kwargs["ssm_ratio"] = ratio_for(n, d_model)
+            keep.update({m: (keep_channels(ss2d_importance(m), n), d) for m in ss2ds})
+        mlps = [m for b in blocks for m in b.modules() if isinstance(m, RGBlock)]
+        if mlps:
+            d_model, h = mlps[0].fc1.in_channels, mlps[0].fc2.in_channels
+            n = min(h, make_divisible(h * (1 - ratio), divisor))
+            kwargs["mlp_ratio"] = ratio_for(math.ceil(1.5 * n), d_model)  # RGBlock keeps int(2 * int(r * d) / 3)
+            keep.update({m: (keep_channels(rgblock_importance(m), n), h) for m in mlps})
+        f, r, module, args = (cfg["backbone"] + cfg["head"])[i]
+        args = list(args)
+        if args and isinstance(args[-1], dict):
+            args[-1] = {**args[-1], **kwargs}
+        else:
+            args.append(kwargs)
+        section, j = ("backbone", i) if i < len(cfg["backbone"]) else ("head", i - len(cfg["backbone"]))
+        cfg[section][j] = [f, r, module, args]
+
+    pruned = DetectionModel(cfg, nc=cfg["nc"], verbose=False)
+    names = {m: n for n, m in model.named_modules()}
+    state = model.state_dict()
+    with torch.no_grad():
+        for m, (idx, width) in keep.items():
+            prefix = f"{names[m]}."
+            for k, v in pruned.get_submodule(names[m]).state_dict().items():
+                state[prefix + k] = slice_channels(state[prefix + k], v.shape, idx, width)
+    pruned.load_state_dict(state)
+    pruned.names, pruned.args = getattr(model, "names", pruned.names), getattr(model, "args", {})
+    if verbose:
+        n0, n1 = get_num_params(model), get_num_params(pruned)
+        LOGGER.info(f"{colorstr('prune:')} ratio={ratio}, {n0} -> {n1} parameters ({1 - n1 / n0:.1%} fewer)")
+    return pruned
+
+
+def slice_channels(t, shape, idx, width):
+    """
+    Index tensor `t` down to `shape` along every dimension that shrank, keeping channels `idx` of `width`.
+
+    A dimension of m * `width` elements holds m consecutive groups of channels, e.g. the x and z halves of `in_proj` or
+    the K directions of `A_logs`, and the same channels are kept in each group.
+    """
+    for dim, (old, new) in enumerate(zip(t.shape, shape)):
+        if old != new:
+            m = old // width
+            assert old == m * width and new == m * len(idx), f"can not prune {tuple(t.shape)} to {tuple(shape)}"
+            t = t.index_select(dim, torch.cat([idx + j * width for j in range(m)]))
+    return t
+
+
+def prune_checkpoint(weights, ratio=0.25, divisor=8, save_dir=None):
+    """
+    Prune a trained Mamba-YOLO checkpoint and write the pruned model YAML and checkpoint next to it.
+
+    Args:
+        weights (str | Path): Checkpoint to prune.
+        ratio (float): Fraction of inner channels to remove, see `prune_mamba`.
+        divisor (int): Channel multiple of the pruned widths.
+        save_dir (str | Path, optional): Output directory, defaults to the directory of `weights`.
+
+    Returns:
+        (tuple): Paths of the pruned YAML and checkpoint.
+    """
+    from ultralytics import __version__
+    from ultralytics.nn.tasks import attempt_load_one_weight
+
+    model, ckpt = attempt_load_one_weight(weights)
+    pruned = prune_mamba(model, ratio, divisor)
+    weights = Path(weights)
+    save_dir = Path(save_dir or weights.parent)
+    save_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{weights.stem}-pruned{round(ratio * 100)}"
+    yaml_file, file = save_dir / f"{stem}.yaml", save_dir / f"{stem}.pt"
+    yaml_save(yaml_file, {k: v for k, v in pruned.yaml.items() if k != "ch"})
+    pruned.yaml["yaml_file"] = str(yaml_file)
+    torch.save(
+        {
+            "date": datetime.now().isoformat(),
+            "version": __version__,
+            "model": deepcopy(pruned).half(),
+            "train_args": ckpt.get("train_args", {}),
+            "pruned": {"from": str(weights), "ratio": ratio},
+        },
+        file,
+    )
+    LOGGER.info(f"{colorstr('prune:')} saved {yaml_file} and {file}")
+    return yaml_file, file
@@ -0,0 +1,179 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""
+Dynamic INT8 quantization of Mamba-YOLO for CPU inference.
+
+The pointwise convolutions of the Mamba blocks (SS2D in/out projections, RGBlock and LSBlock fc layers, block
+projections) and the SS2D `x_proj_weight` einsum run as dynamically quantized INT8 matrix multiplies. The selective
+scan, its step-size projection and the detection head stay in fp32.
+
+Usage:
+    from ultralytics import YOLO
+    from ultralytics.utils.quantize import quantize_dynamic_int8, validate_int8
+
+    model = quantize_dynamic_int8(YOLO('mamba-yolo.pt').model)  # quantize every candidate layer
+    model, results = validate_int8(YOLO('mamba-yolo.pt').model, data='coco.yaml', imgsz=640)  # calibrate and compare
+"""
+
+import itertools
+from copy import deepcopy
+
+import torch
+import torch.nn as nn
+
+from ultralytics.utils import LOGGER, colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+
+class DynamicQuantConv(nn.Module):
+    """
+    Pointwise convolution computed by a dynamically quantized INT8 `nn.Linear` over the channel dimension.
+
+    Weights are stored in INT8 with per-output-channel scales. Activations are quantized on every call from their
+    observed range, so no activation statistics are stored.
+    """
+
+    def __init__(self, conv):
+        """Quantize the weights of pointwise `conv`, an `nn.Conv1d` or `nn.Conv2d` with kernel size 1."""
+        super().__init__()
+        linear = nn.Linear(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+        linear.weight.data = conv.weight.detach().flatten(1).float()
+        if conv.bias is not None:
+            linear.bias.data = conv.bias.detach().float()
+        linear.qconfig = torch.ao.quantization.per_channel_dynamic_qconfig
+        self.linear = torch.ao.nn.quantized.dynamic.Linear.from_float(linear)
+
+    def forward(self, x):
+        """Apply the INT8 projection to the channels of (B, C, ...) input `x`."""
+        return self.linear(x.movedim(1, -1)).movedim(-1, 1)
+
+
+def is_pointwise(m):
+    """Whether `m` is a convolution that is a per-position matrix multiply."""
+    return (
+        isinstance(m, (nn.Conv1d, nn.Conv2d))
+        and m.groups == 1
+        and all(k == 1 for k in m.kernel_size)
+        and all(s == 1 for s in m.stride)
+        and all(p == 0 for p in m.padding)
+    )
+
+
+def mamba_projections(model):
+    """
+    Prepare `model` for quantization and return the names of the pointwise convolutions inside its Mamba blocks.
+
+    The SS2D `x_proj_weight` einsum is replaced by an equivalent `nn.Conv1d` `x_proj` so that it is quantized like the
+    other projections. `dt_projs_weight` is left as is, it feeds the exponentiated step sizes of the scan.
+    """
+    from ultralytics.nn.modules import mamba_yolo
+
+    for m in model.modules():
+        if isinstance(m, mamba_yolo.SS2D) and hasattr(m, "x_proj_weight"):
+            k, c, d = m.x_proj_weight.shape
+            m.x_proj = nn.Conv1d(d, k * c, 1, bias=False)
+            m.x_proj.weight.data = m.x_proj_weight.detach().reshape(k * c, d, 1)
+            del m.x_proj_weight
+
+    blocks = [m for m in model.modules() if type(m).__module__ == mamba_yolo.__name__]
+    names = {id(m): n for n, m in model.named_modules()}
+    return list(dict.fromkeys(names[id(m)] for b in blocks for m in b.modules() if is_pointwise(m)))
+
+
+def calibrate(model, layers, batches):
+    """
+    Return the relative RMS error of each of `layers` when computed in INT8, measured on its inputs for `batches`.
+
+    Args:
+        model (nn.Module): fp32 model that is run on the batches.
+        layers (list): Pointwise convolutions of `model` to measure.
+        batches (Iterable): Preprocessed images (B, 3, H, W).
+
+    Returns:
+        (dict): Layer to relative error ||int8 - fp32|| / ||fp32||.
+    """
+    errors = {m: [0.0, 0.0] for m in layers}
+    quantized = {m: DynamicQuantConv(m) for m in layers}
+
+    def hook(m, args, y):
+        errors[m][0] += (quantized[m](args[0]) - y).square().sum().item()
+        errors[m][1] += y.square().sum().item()
+
+    hooks = [m.register_forward_hook(hook) for m in layers]
+    try:
+        with torch.no_grad():
+            for im in batches:
+                model(im)
+    finally:
+        for h in hooks:
+            h.remove()
+    return {m: (e / s) ** 0.5 if s else 0.0 for m, (e, s) in errors.items()}
+
+
+def quantize_dynamic_int8(model, batches=None, max_error=0.05, verbose=True):
+    """
+    Return a CPU copy of `model` with the pointwise projections of its Mamba blocks quantized to dynamic INT8.
+
+    Args:
+        model (nn.Module): Model to quantize, it is copied and fused first so folded BatchNorm weights are quantized.
+        batches (Iterable, optional): Preprocessed calibration images (B, 3, H, W). Layers whose INT8 output deviates
+            from fp32 by more than `max_error` on them stay in fp32. Without batches every candidate is quantized.
+        max_error (float): Maximum relative RMS output error of a quantized layer.
+        verbose (bool): Log the number of quantized layers and the weight memory.
+
+    Returns:
+        (nn.Module): The quantized model in eval mode.
+    """
+    from ultralytics.nn.tasks import BaseModel
+
+    prefix = colorstr("INT8:")
+    model = deepcopy(de_parallel(model)).cpu().float().eval()
+    if isinstance(model, BaseModel):
+        model.fuse(verbose=False)
+    names = mamba_projections(model)
+    layers = [model.get_submodule(n) for n in names]
+    errors = calibrate(model, layers, batches) if batches is not None else {}
+    size = sum(m.weight.numel() * 4 for m in layers)
+    for name, m in zip(names, layers):
+        if errors.get(m, 0.0) > max_error:
+            LOGGER.info(f"{prefix} keeping {name} in fp32, INT8 error {errors[m]:.3f} > {max_error}")
+            continue
+        parent, _, attr = name.rpartition(".")
+        setattr(model.get_submodule(parent), attr, DynamicQuantConv(m))
+        size -= m.weight.numel() * 3
+    if verbose:
+        n = sum(isinstance(m, DynamicQuantConv) for m in model.modules())
+        LOGGER.info(f"{prefix} quantized {n}/{len(layers)} projections, {size / 2 ** 20:.1f} MB projection weights")
+    return model
+
+
+def validate_int8(model, data, imgsz=640, batch=16, calib_batches=4, max_error=0.05, **kwargs):
+    """
+    Quantize `model` with calibration batches from the validation set and compare its accuracy to fp32.
+
+    Args:
+        model (nn.Module): Detection model to quantize.
+        data (str): Dataset YAML.
+        imgsz (int): Validation image size.
+        batch (int): Validation batch size.
+        calib_batches (int): Number of validation batches used for calibration.
+        max_error (float): Maximum relative RMS output error of a quantized layer, see `quantize_dynamic_int8`.
+        **kwargs (Any): Other `DetectionValidator` arguments.
+
+    Returns:
+        (tuple): Quantized model and {"fp32": stats, "int8": stats, "delta": int8 - fp32 of every stat}.
+    """
+    from ultralytics.models.yolo.detect import DetectionValidator
+
+    validator = DetectionValidator(
+        args={"data": data, "imgsz": imgsz, "batch": batch, "device": "cpu", "half": False, "plots": False, **kwargs}
+    )
+    fp32 = validator(model=deepcopy(model))  # builds validator.dataloader
+    batches = (validator.preprocess(b)["img"] for b in itertools.islice(validator.dataloader, calib_batches))
+    qmodel = quantize_dynamic_int8(model, batches, max_error)
+    int8 = validator(model=deepcopy(qmodel))
+    delta = {k: int8[k] - fp32[k] for k in fp32}
+    LOGGER.info(
+        f"{colorstr('INT8:')} mAP50-95 {int8['metrics/mAP50-95(B)']:.4f} vs fp32 {fp32['metrics/mAP50-95(B)']:.4f} "
+        f"({delta['metrics/mAP50-95(B)']:+.4f})"
+    )
+    return qmodel, {"fp32": fp32, "int8": int8, "delta": delta}
@@ -23,9 +23,11 @@ class TaskAlignedAssigner(nn.Module):
         alpha (float): The alpha parameter for the classification component of the task-aligned metric.
         beta (float): The beta parameter for the localization component of the task-aligned metric.
         eps (float): A small value to prevent division by zero.
+        chunk (int): If nonzero, assign over the anchors inside each gt box only, in blocks of `chunk` gt boxes, see
+            `forward_sparse`.
     """
 
-    def __init__(self, topk=13, num_classes=80, alpha=1.0, beta=6.0, eps=1e-9):
+    def __init__(self, topk=13, num_classes=80, alpha=1.0, beta=6.0, eps=1e-9, chunk=0):
         """Initialize a TaskAlignedAssigner object with customizable hyperparameters."""
         super().__init__()
         self.topk = topk
@@ -34,6 +36,7 @@ class TaskAlignedAssigner(nn.Module):
         self.alpha = alpha
         self.beta = beta
         self.eps = eps
+        self.chunk = chunk
 
     @torch.no_grad()
     def forward(self, pd_scores, pd_bboxes, anc_points, gt_labels, gt_bboxes, mask_gt):
@@ -68,6 +71,8 @@ class TaskAlignedAssigner(nn.Module):
                 torch.zeros_like(pd_scores[..., 0]).to(device),
                 torch.zeros_like(pd_scores[..., 0]).to(device),
             )
+        if self.chunk:
+            return self.forward_sparse(pd_scores, pd_bboxes, anc_points, gt_labels, gt_bboxes, mask_gt)
 
         mask_pos, align_metric, overlaps = self.get_pos_mask(
             pd_scores, pd_bboxes, gt_labels, gt_bboxes, anc_points, mask_gt
@@ -87,6 +92,73 @@ class TaskAlignedAssigner(nn.Module):
 
         return target_labels, target_bboxes, target_scores, fg_mask.bool(), target_gt_idx
 
+    def forward_sparse(self, pd_scores, pd_bboxes, anc_points, gt_labels, gt_bboxes, mask_gt):
+        """
+        Compute the assignment of `forward` from the (gt, anchor inside the gt box) pairs only.
+
+        The gt boxes are processed in blocks of `chunk`, and instead of (bs, n_max_boxes, num_total_anchors) tensors
+        only per-pair and per-anchor tensors are kept, so memory grows with the number of real candidate pairs and a
+        crowded image does not inflate the whole batch. Assignments are those of `forward`, with equal align metrics
+        ranked by anchor index and anchors of zero align metric never positive; the dense top-k only picks those to fill
+        up k, in an order `torch.topk` leaves unspecified.
+
+        Args and returns are those of `forward`.
+        """
+        na, device = anc_points.shape[0], gt_bboxes.device
+        dtype = torch.promote_types(pd_scores.dtype, pd_bboxes.dtype)  # align metric dtype
+        count = torch.zeros(self.bs * na, dtype=torch.long, device=device)  # positive gts of each anchor
+        # gt index, align metric and overlap of the positive gt (pos) and of the highest overlap gt (top) of each anchor
+        pos_gt, top_gt = torch.zeros(2, self.bs * na, dtype=torch.long, device=device)
+        pos_metric, top_metric = torch.zeros(2, self.bs * na, dtype=dtype, device=device)
+        pos_overlap, top_overlap = torch.zeros(2, self.bs * na, dtype=pd_bboxes.dtype, device=device)
+
+        b, g = mask_gt.squeeze(-1).nonzero(as_tuple=True)  # real gts in (image, gt) order
+        for i in range(0, len(b), self.chunk):
+            bi, gi = b[i : i + self.chunk], g[i : i + self.chunk]
+            k, a = self.select_candidates_in_gts(anc_points, gt_bboxes[bi, gi][None])[0].nonzero(as_tuple=True)
+            bk, gk = bi[k], gi[k]
+            scores = pd_scores[bk, a, gt_labels[bk, gk, 0].long()]
+            overlaps = self.iou_calculation(gt_bboxes[bk, gk], pd_bboxes[bk, a]).to(pd_bboxes.dtype)
+            metric = scores.pow(self.alpha) * overlaps.pow(self.beta)
+
+            # Top-k pairs of each gt: rank the pairs of a gt by metric, pairs are grouped by gt in ascending anchors
+            order = metric.argsort(descending=True, stable=True)
+            order = order[k[order].argsort(stable=True)]
+            counts = torch.bincount(k, minlength=len(bi))
+            rank = torch.empty_like(k)
+            rank[order] = torch.arange(len(k), device=device) - (counts.cumsum(0) - counts)[k[order]]
+            j = bk * na + a  # flat anchor index
+            sel = (rank < self.topk) & (metric > 0)
+            count.index_add_(0, j[sel], torch.ones_like(j[sel]))
+            pos_gt[j[sel]], pos_metric[j[sel]], pos_overlap[j[sel]] = gk[sel], metric[sel], overlaps[sel]
+
+            # Highest overlap gt of each anchor, the first one on ties as in argmax
+            top = torch.zeros_like(top_overlap).scatter_reduce_(0, j, overlaps, "amax")
+            hit = overlaps == top[j]
+            first = torch.full_like(top_gt, self.n_max_boxes).scatter_reduce_(0, j[hit], gk[hit], "amin")
+            new = hit & (gk == first[j]) & (top[j] > top_overlap[j])
+            top_gt[j[new]], top_metric[j[new]], top_overlap[j[new]] = gk[new], metric[new], overlaps[new]
+
+        # Anchors assigned to multiple gts keep the one of highest overlap
+        multi = count > 1
+        fg_mask = count > 0
+        target_gt_idx = torch.where(multi, top_gt, pos_gt) * fg_mask
+        metric = torch.where(multi, top_metric, pos_metric)[fg_mask]
+        overlaps = torch.where(multi, top_overlap, pos_overlap)[fg_mask]
+
+        # Normalize
+        gt = torch.arange(self.bs, device=device).repeat_interleave(na)[fg_mask] * self.n_max_boxes
+        gt += target_gt_idx[fg_mask]  # flat gt index of each positive anchor
+        pos_align_metrics = metric.new_zeros(self.bs * self.n_max_boxes).scatter_reduce_(0, gt, metric, "amax")
+        pos_overlaps = overlaps.new_zeros(self.bs * self.n_max_boxes).scatter_reduce_(0, gt, overlaps, "amax")
+        norm_align_metric = metric.new_zeros(self.bs * na)
+        norm_align_metric[fg_mask] = metric * pos_overlaps[gt] / (pos_align_metrics[gt] + self.eps)
+
+        target_gt_idx, fg_mask = target_gt_idx.view(self.bs, na), fg_mask.view(self.bs, na)
+        target_labels, target_bboxes, target_scores = self.get_targets(gt_labels, gt_bboxes, target_gt_idx, fg_mask)
+        target_scores = target_scores * norm_align_metric.view(self.bs, na, 1)
+        return target_labels, target_bboxes, target_scores, fg_mask, target_gt_idx
+
     def get_pos_mask(self, pd_scores, pd_bboxes, gt_labels, gt_bboxes, anc_points, mask_gt):
         """Get in_gts mask, (b, max_num_obj, h*w)."""
         mask_in_gts = self.select_candidates_in_gts(anc_points, gt_bboxes)
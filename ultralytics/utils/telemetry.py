@@ -0,0 +1,159 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""
+Per-step timing of the training loop.
+
+`StepTelemetry` times the phases of every training step: the wait for the next batch, forward, backward, optimizer
+step, EMA update and callbacks. Phases are timed on the host with `time.perf_counter()`. On CUDA the compute phases are
+timed by CUDA events on the current stream instead, read once they have completed, so timing never synchronizes the
+device. Rolling means over recent steps are reported as 'time/<phase>' milliseconds, and a range of steps can be
+exported as a Chrome trace for chrome://tracing or https://ui.perfetto.dev.
+
+Usage:
+    telemetry = StepTelemetry("cuda:0", trace=(10, 20), trace_file="trace.json")
+    for batch in telemetry.iterate(loader):  # times the wait for each batch as 'data'
+        with telemetry.time("forward"):
+            loss = model(batch)
+        telemetry.step()
+    print(telemetry.summary())  # {'time/data': 1.2, 'time/forward': 35.1, ...}
+"""
+
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import torch
+
+from ultralytics.utils import LOGGER, colorstr
+
+
+class StepTelemetry:
+    """
+    Low-overhead timers of the phases of training steps.
+
+    A phase timed inside another one, e.g. the EMA update inside the optimizer step, is subtracted from the outer phase,
+    so the phases of a step add up to at most its wall time 'step'.
+
+    Attributes:
+        cuda (bool): Whether device phases are timed with CUDA events.
+        window (deque): Phase milliseconds of the last finished steps, averaged by `summary()`.
+        pending (deque): Finished steps whose CUDA events have not completed yet.
+        trace (tuple | None): Range [start, stop) of steps exported as a Chrome trace to `trace_file`.
+        trace_events (list): Chrome trace events of the traced steps recorded so far.
+        steps (int): Number of finished steps.
+    """
+
+    PHASES = "data", "forward", "backward", "optimizer", "ema", "callbacks"
+    DEVICE_PHASES = {"forward", "backward", "optimizer", "ema"}  # timed on the device on CUDA
+
+    def __init__(self, device, window=100, trace=None, trace_file="trace.json"):
+        """
+        Initialize the timers.
+
+        Args:
+            device (torch.device | str): Training device.
+            window (int): Number of recent steps the rolling means are taken over.
+            trace (tuple, optional): Steps [start, stop) to export as a Chrome trace.
+            trace_file (str | Path): Chrome trace JSON file.
+        """
+        self.cuda = torch.device(device).type == "cuda"
+        self.window = deque(maxlen=window)
+        self.pending = deque()
+        self.trace, self.trace_file, self.trace_events = trace, trace_file, []
+        self.steps = 0
+        self.phases = []  # [name, host start, host end, start event, end event, parent index] of the current step
+        self.stack = []  # indices of the open phases
+        self.step_start = time.perf_counter()
+
+    @contextmanager
+    def time(self, name):
+        """Time the enclosed code as phase `name` of the current step."""
+        event = self.cuda and name in self.DEVICE_PHASES
+        i = len(self.phases)
+        parent = self.stack[-1] if self.stack else None
+        self.phases.append([name, time.perf_counter(), None, self.event() if event else None, None, parent])
+        self.stack.append(i)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            self.phases[i][2] = time.perf_counter()
+            self.phases[i][4] = self.event() if event else None
+
+    @staticmethod
+    def event():
+        """Record a timing CUDA event on the current stream."""
+        e = torch.cuda.Event(enable_timing=True)
+        e.record()
+        return e
+
+    def iterate(self, iterable):
+        """Yield the items of `iterable`, timing the wait for each one as phase 'data'."""
+        iterator = iter(iterable)
+        self.step_start = time.perf_counter()  # steps of a new epoch do not include the time between epochs
+        while True:
+            with self.time("data"):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                self.phases.pop()  # no step follows the exhausted iterator
+                return
+            yield item
+
+    def step(self):
+        """Finish the current step."""
+        t = time.perf_counter()
+        self.phases.append(["step", self.step_start, t, None, None, None])
+        self.pending.append((self.steps, self.phases))
+        self.phases, self.step_start = [], t
+        self.steps += 1
+        self.flush()
+        if self.trace and self.steps == self.trace[1]:
+            self.save_trace()
+
+    def flush(self, wait=False):
+        """Move finished steps whose CUDA events have completed into the window, waiting for them if `wait`."""
+        while self.pending:
+            n, phases = self.pending[0]
+            events = [p[4] for p in phases if p[4] is not None]
+            if not wait and not all(e.query() for e in events):
+                break
+            for e in events:
+                e.synchronize()
+            self.pending.popleft()
+            ms = [p[3].elapsed_time(p[4]) if p[3] is not None else (p[2] - p[1]) * 1e3 for p in phases]
+            own = list(ms)
+            for p, t in zip(phases, ms):
+                if p[5] is not None:
+                    own[p[5]] -= t  # exclude nested phases
+            times = dict.fromkeys((*self.PHASES, "step"), 0.0)
+            for p, t in zip(phases, own):
+                times[p[0]] = times.get(p[0], 0.0) + t
+            self.window.append(times)
+            if self.trace and self.trace[0] <= n < self.trace[1]:
+                self.trace_events.extend(
+                    {
+                        "name": p[0],
+                        "cat": "device" if p[3] is not None else "host",
+                        "ph": "X",
+                        "ts": p[1] * 1e6,
+                        "dur": t * 1e3,  # device time on CUDA, shown from the host launch
+                        "pid": 0,
+                        "tid": "step" if p[0] == "step" else "phases",
+                        "args": {"step": n},
+                    }
+                    for p, t in zip(phases, ms)
+                )
+
+    def summary(self):
+        """Returns the mean milliseconds per step of each phase over the window, i.e. {'time/data': 1.2, ...}."""
+        self.flush()
+        n = max(len(self.window), 1)
+        return {f"time/{k}": sum(t.get(k, 0.0) for t in self.window) / n for k in (*self.PHASES, "step")}
+
+    def save_trace(self):
+        """Write the traced steps to `trace_file` as a Chrome trace."""
+        self.flush(wait=True)
+        with open(self.trace_file, "w") as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+        start, stop = self.trace
+        LOGGER.info(f"{colorstr('telemetry:')} saved Chrome trace of steps {start}-{stop - 1} to {self.trace_file}")
@@ -1,11 +1,14 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
 import gc
+import itertools
 import math
 import os
+import queue
 import random
 import time
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from copy import deepcopy
 from pathlib import Path
 from typing import Union
@@ -36,6 +39,7 @@ except ImportError:
 TORCH_1_9 = check_version(torch.__version__, "1.9.0")
 TORCH_1_13 = check_version(torch.__version__, "1.13.0")
 TORCH_2_0 = check_version(torch.__version__, "2.0.0")
+TORCH_2_1 = check_version(torch.__version__, "2.1.0")
 TORCHVISION_0_10 = check_version(TORCHVISION_VERSION, "0.10.0")
 TORCHVISION_0_11 = check_version(TORCHVISION_VERSION, "0.11.0")
 TORCHVISION_0_13 = check_version(TORCHVISION_VERSION, "0.13.0")
@@ -182,6 +186,32 @@ def time_sync():
     return time.time()
 
 
+def concurrent_map(fn, args, device):
+    """
+    Return [fn(a) for a in args] computed concurrently, in one thread per item and on CUDA `device` one stream each.
+
+    The caller's grad and inference modes, which are thread-local, apply in every thread. The streams start after the
+    work queued on the current stream, which waits for them before the results are returned.
+    """
+    device = torch.device(device)
+    grad, inference = torch.is_grad_enabled(), torch.is_inference_mode_enabled()
+    streams = [torch.cuda.Stream(device) for _ in args] if device.type == "cuda" else [None] * len(args)
+    for stream in filter(None, streams):
+        stream.wait_stream(torch.cuda.current_stream(device))
+
+    def run(a, stream):
+        """Apply `fn` to `a` on `stream` with the caller's grad mode."""
+        with torch.cuda.stream(stream) if stream else nullcontext(), torch.inference_mode(inference):
+            with torch.set_grad_enabled(grad):
+                return fn(a)
+
+    with ThreadPoolExecutor(max(len(args), 1)) as pool:
+        results = list(pool.map(run, args, streams))
+    for stream in filter(None, streams):
+        torch.cuda.current_stream(device).wait_stream(stream)
+    return results
+
+
 def fuse_conv_and_bn(conv, bn):
     """Fuse Conv2d() and BatchNorm2d() layers https://tehnokv.com/posts/fusing-batchnorm-and-conv/."""
     fusedconv = (
@@ -268,6 +298,8 @@ def model_info(model, detailed=False, verbose=True, imgsz=640):
     flops = get_flops(model, imgsz)
     fused = " (fused)" if getattr(model, "is_fused", lambda: False)() else ""
     fs = f", {flops:.1f} GFLOPs" if flops else ""
+    if cost := get_model_scan_cost(model, imgsz):
+        fs += f", scan {cost['bytes'] / 1e9:.2f} GB moved, {cost['saved'] / 2 ** 20:.1f} MB saved for backward"
     yaml_file = getattr(model, "yaml_file", "") or getattr(model, "yaml", {}).get("yaml_file", "")
     model_name = Path(yaml_file).stem.replace("yolo", "YOLO") or "Model"
     LOGGER.info(f"{model_name} summary{fused}: {n_l} layers, {n_p} parameters, {n_g} gradients{fs}")
@@ -301,6 +333,7 @@ def model_info_for_loggers(trainer):
     if trainer.args.profile:  # profile ONNX and TensorRT times
         from ultralytics.utils.benchmarks import ProfileModels
 
+        trainer.checkpoint_writer.wait()  # last.pt of this epoch is written in the background
         results = ProfileModels([trainer.last], device=trainer.device).profile()[0]
         results.pop("model/name")
     else:  # only return PyTorch times from most recent validation
@@ -312,6 +345,69 @@ def model_info_for_loggers(trainer):
     return results
 
 
+def get_thop_custom_ops(model):
+    """
+    Return thop rules for the modules of `model` with an analytic `cost(shape)` method, i.e. SS2D.
+
+    thop counts multiply-accumulates of the standard layers it knows, the rules add each module's own arithmetic (the
+    selective scan) on top of what its child modules are counted for.
+    """
+
+    def count(m, x, y):
+        m.total_ops += m.cost(x[0].shape)["flops"] // 2  # FLOPs to MACs
+
+    return {type(m): count for m in model.modules() if callable(getattr(m, "cost", None))}
+
+
+def get_scan_cost(model, x, scale=(1, 1)):
+    """
+    Return the analytic cost of the modules in `model` with a `cost(shape)` method for a forward pass on `x`.
+
+    Input shapes are recorded during one forward pass, then each module is costed with its spatial size multiplied by
+    `scale` so that a small proxy input can stand in for the full image size.
+
+    Args:
+        model (nn.Module): Model or layer to cost.
+        x (torch.Tensor | list): Input of the forward pass.
+        scale (tuple): Height and width multipliers applied to the recorded input shapes.
+
+    Returns:
+        (dict): Summed {"flops": int, "bytes": int, "saved": int}, empty if `model` has no such modules.
+    """
+    layers = [m for m in model.modules() if callable(getattr(m, "cost", None))]
+    if not layers:
+        return {}
+    shapes = []
+    hooks = [m.register_forward_pre_hook(lambda m, args: shapes.append((m, args[0].shape))) for m in layers]
+    try:
+        with torch.no_grad():
+            model(x)
+    finally:
+        for h in hooks:
+            h.remove()
+    total = dict.fromkeys(("flops", "bytes", "saved"), 0)
+    for m, (b, c, h, w) in shapes:
+        for k, v in m.cost((b, c, math.ceil(h * scale[0]), math.ceil(w * scale[1]))).items():
+            total[k] += v
+    return total
+
+
+def get_model_scan_cost(model, imgsz=640):
+    """Return the analytic scan cost of a YOLO model for one image of `imgsz`, see `get_scan_cost`."""
+    try:
+        model = de_parallel(model)
+        if not get_thop_custom_ops(model):
+            return {}
+        p = next(model.parameters())
+        if not isinstance(imgsz, list):
+            imgsz = [imgsz, imgsz]  # expand if int/float
+        stride = max(int(model.stride.max()), 32) if hasattr(model, "stride") else 32  # max stride
+        im = torch.empty((1, p.shape[1], stride, stride), device=p.device)  # input image in BCHW format
+        return get_scan_cost(deepcopy(model).eval(), im, (imgsz[0] / stride, imgsz[1] / stride))
+    except Exception:
+        return {}
+
+
 def get_flops(model, imgsz=640):
     """Return a YOLO model's FLOPs."""
     if not thop:
@@ -320,18 +416,19 @@ def get_flops(model, imgsz=640):
     try:
         model = de_parallel(model)
         p = next(model.parameters())
+        ops = get_thop_custom_ops(model)
         if not isinstance(imgsz, list):
             imgsz = [imgsz, imgsz]  # expand if int/float
         try:
             # Use stride size for input tensor
             stride = max(int(model.stride.max()), 32) if hasattr(model, "stride") else 32  # max stride
             im = torch.empty((1, p.shape[1], stride, stride), device=p.device)  # input image in BCHW format
-            flops = thop.profile(deepcopy(model), inputs=[im], verbose=False)[0] / 1e9 * 2  # stride GFLOPs
+            flops = thop.profile(deepcopy(model), [im], custom_ops=ops, verbose=False)[0] / 1e9 * 2  # stride GFLOPs
             return flops * imgsz[0] / stride * imgsz[1] / stride  # imgsz GFLOPs
         except Exception:
             # Use actual image size for input tensor (i.e. required for RTDETR models)
             im = torch.empty((1, p.shape[1], *imgsz), device=p.device)  # input image in BCHW format
-            return thop.profile(deepcopy(model), inputs=[im], verbose=False)[0] / 1e9 * 2  # imgsz GFLOPs
+            return thop.profile(deepcopy(model), [im], custom_ops=ops, verbose=False)[0] / 1e9 * 2  # imgsz GFLOPs
     except Exception:
         return 0.0
 
@@ -361,6 +458,41 @@ def get_flops_with_torch_profiler(model, imgsz=640):
     return flops
 
 
+def get_saved_activation_bytes(model, imgsz=640, use_checkpoint=None):
+    """
+    Return the bytes of activations a training forward pass keeps alive for backward on a single image.
+
+    Args:
+        model (nn.Module): Model to measure, it is copied so running statistics are left untouched.
+        imgsz (int | list): Input image size.
+        use_checkpoint (bool, optional): Override the `use_checkpoint` flag of every module that has one.
+
+    Returns:
+        (int): Bytes of saved tensors, excluding model parameters.
+    """
+    model = deepcopy(de_parallel(model)).train()
+    if use_checkpoint is not None:
+        for m in model.modules():
+            if hasattr(m, "use_checkpoint"):
+                m.use_checkpoint = use_checkpoint
+    p = next(model.parameters())
+    if not isinstance(imgsz, list):
+        imgsz = [imgsz, imgsz]  # expand if int/float
+    im = torch.zeros((1, p.shape[1], *imgsz), device=p.device)  # input image in BCHW format
+    params = {x.untyped_storage().data_ptr() for x in model.parameters()}
+    storages = {}
+
+    def pack(t):
+        """Record the storage behind each tensor saved for backward."""
+        s = t.untyped_storage()
+        storages[s.data_ptr()] = s.nbytes()
+        return t
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+        model(im)
+    return sum(n for k, n in storages.items() if k not in params)
+
+
 def initialize_weights(model):
     """Initialize model weights to random values."""
     for m in model.modules():
@@ -419,6 +551,11 @@ def intersect_dicts(da, db, exclude=()):
     return {k: v for k, v in da.items() if k in db and all(x not in k for x in exclude) and v.shape == db[k].shape}
 
 
+def is_state_dict(weights):
+    """Returns True if `weights` is a state dict, i.e. a dict of tensors rather than a checkpoint dict or model."""
+    return isinstance(weights, dict) and all(isinstance(v, torch.Tensor) for v in weights.values())
+
+
 def is_parallel(model):
     """Returns True if model is of type DP or DDP."""
     return isinstance(model, (nn.parallel.DataParallel, nn.parallel.DistributedDataParallel))
@@ -460,34 +597,45 @@ class ModelEMA:
     Keeps a moving average of everything in the model state_dict (parameters and buffers)
     For EMA details see https://www.tensorflow.org/api_docs/python/tf/train/ExponentialMovingAverage
     To disable EMA set the `enabled` attribute to `False`.
+    The average is updated with multi-tensor (foreach) ops over cached lists of the EMA and model tensors. With
+    `interval=n` it is updated every n steps with the decay raised to the n-th power, i.e. as n decay steps.
     """
 
-    def __init__(self, model, decay=0.9999, tau=2000, updates=0):
+    def __init__(self, model, decay=0.9999, tau=2000, updates=0, interval=1):
         """Create EMA."""
         self.ema = deepcopy(de_parallel(model)).eval()  # FP32 EMA
         self.updates = updates  # number of EMA updates
         self.decay = lambda x: decay * (1 - math.exp(-x / tau))  # decay exponential ramp (to help early epochs)
+        self.interval = max(int(interval), 1)  # steps per EMA update
         for p in self.ema.parameters():
             p.requires_grad_(False)
         self.enabled = True
+        self.tensors = None  # (model, EMA tensors, model tensors) cached by get_tensors()
+
+    def get_tensors(self, model):
+        """Return the floating point EMA state tensors and the matching state tensors of `model`, cached per model."""
+        if self.tensors is None or self.tensors[0] is not model:
+            msd = de_parallel(model).state_dict()  # model state_dict
+            esd = {k: v for k, v in self.ema.state_dict().items() if v.dtype.is_floating_point}  # FP16 and FP32
+            self.tensors = model, list(esd.values()), [msd[k].detach() for k in esd]
+        return self.tensors[1:]
 
     def update(self, model):
         """Update EMA parameters."""
         if self.enabled:
             self.updates += 1
-            d = self.decay(self.updates)
-
-            msd = de_parallel(model).state_dict()  # model state_dict
-            for k, v in self.ema.state_dict().items():
-                if v.dtype.is_floating_point:  # true for FP16 and FP32
-                    v *= d
-                    v += (1 - d) * msd[k].detach()
-                    # assert v.dtype == msd[k].dtype == torch.float32, f'{k}: EMA {v.dtype},  model {msd[k].dtype}'
+            if self.updates % self.interval:
+                return
+            d = self.decay(self.updates) ** self.interval
+            ema, msd = self.get_tensors(model)
+            torch._foreach_mul_(ema, d)
+            torch._foreach_add_(ema, msd, alpha=1 - d)
 
     def update_attr(self, model, include=(), exclude=("process_group", "reducer")):
         """Updates attributes and saves stripped model with optimizer removed."""
         if self.enabled:
             copy_attr(self.ema, model, include, exclude)
+            self.tensors = None  # attributes may replace tensors
 
 
 def strip_optimizer(f: Union[str, Path] = "best.pt", s: str = "") -> None:
@@ -547,6 +695,112 @@ def convert_optimizer_state_dict_to_fp16(state_dict):
     return state_dict
 
 
+def write_atomic(file, data):
+    """Write bytes `data` to a temporary file next to `file` and rename it over `file`, so `file` is never partial."""
+    file = Path(file)
+    tmp = file.with_name(f".{file.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, file)
+
+
+class CheckpointWriter:
+    """
+    Writes training checkpoints in a background thread.
+
+    `save()` snapshots the tensors and modules of a checkpoint into CPU buffers and returns, the serialization and file
+    writes run in a worker thread. Buffers are reused across checkpoints and pinned for CUDA tensors, so the snapshot
+    copies are queued on the current stream without blocking. At most `max_pending` checkpoints are in flight, each with
+    its own buffers; `save()` waits for the oldest one beyond that.
+
+    Example:
+        ```python
+        writer = CheckpointWriter()
+        writer.save({"model": model, "epoch": 3}, lambda ckpt: write_atomic("last.pt", pickle.dumps(ckpt)))
+        writer.wait()  # all checkpoints written
+        ```
+    """
+
+    def __init__(self, max_pending=1):
+        """Create a writer with at most `max_pending` checkpoints snapshotted but not yet written."""
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self.buffers = queue.Queue()  # free buffer sets, one per in-flight checkpoint
+        for _ in range(max_pending):
+            self.buffers.put({})
+        self.futures = []
+
+    def save(self, ckpt, write):
+        """
+        Snapshot `ckpt` and call `write(snapshot)` in the worker thread.
+
+        Args:
+            ckpt (dict): Checkpoint of nested dicts, lists and tuples. Tensors and modules are copied to CPU buffers,
+                other values are deep-copied, so training can modify the originals as soon as `save()` returns.
+            write (Callable): Serializes and writes the snapshot, it must not touch live training state.
+        """
+        self.raise_errors()
+        buffers = self.buffers.get()  # blocks while max_pending checkpoints are in flight
+        try:
+            snapshot = self.snapshot(ckpt, buffers)
+        except Exception:
+            self.buffers.put(buffers)
+            raise
+        event = None
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            event = torch.cuda.Event()
+            event.record()  # snapshot copies queued before this point
+
+        def run():
+            """Wait for the snapshot copies and write the checkpoint, then free its buffers."""
+            try:
+                if event is not None:
+                    event.synchronize()
+                write(snapshot)
+            finally:
+                self.buffers.put(buffers)
+
+        self.futures.append(self.executor.submit(run))
+
+    @torch.no_grad()
+    def snapshot(self, x, buffers, key=()):
+        """Return a copy of `x` whose tensors and modules live in `buffers`, keyed by their path in `x`."""
+        if isinstance(x, torch.Tensor):
+            b = buffers.get(key)
+            if not isinstance(b, torch.Tensor) or b.shape != x.shape or b.dtype != x.dtype:
+                b = buffers[key] = torch.empty(x.shape, dtype=x.dtype, pin_memory=x.is_cuda)
+            return b.copy_(x.detach(), non_blocking=True)
+        if isinstance(x, nn.Module):
+            m = buffers.get(key)
+            if type(m) is not type(x):
+                m = buffers[key] = deepcopy(x).cpu()
+                if any(t.is_cuda for t in itertools.chain(x.parameters(), x.buffers())):
+                    for t in itertools.chain(m.parameters(), m.buffers()):
+                        t.data = t.data.pin_memory()
+            for b, t in zip(m.state_dict().values(), x.state_dict().values()):
+                b.copy_(t, non_blocking=True)
+            return m
+        if isinstance(x, dict):
+            return {k: self.snapshot(v, buffers, (*key, k)) for k, v in x.items()}
+        if isinstance(x, (list, tuple)):
+            return type(x)(self.snapshot(v, buffers, (*key, i)) for i, v in enumerate(x))
+        return deepcopy(x)
+
+    def raise_errors(self):
+        """Drop finished writes and re-raise the first error of a failed one."""
+        done = [f for f in self.futures if f.done()]
+        self.futures = [f for f in self.futures if not f.done()]
+        for f in done:
+            f.result()
+
+    def wait(self):
+        """Block until every checkpoint is written, re-raising write errors."""
+        futures, self.futures = self.futures, []
+        for f in futures:
+            f.result()
+
+
 def profile(input, ops, n=10, device=None):
     """
     Ultralytics speed, memory and FLOPs profiler.
@@ -0,0 +1,196 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""
+Memory-mapped weight files.
+
+A model is saved as a `.safetensors` file holding its parameters, buffers and plain tensor attributes such as strides,
+and a YAML sidecar of the same name holding the model YAML, class names, train args and other metadata. Loading maps the
+tensor file copy-on-write and builds the model on the meta device around it, so nothing is unpickled, no weight is
+copied, and processes loading the same file share its pages until they modify them.
+
+Usage:
+    from ultralytics import YOLO
+    from ultralytics.utils.weights import save_weights
+
+    save_weights(YOLO('mamba-yolo.pt').model, 'mamba-yolo.safetensors')  # also writes mamba-yolo.yaml
+    YOLO('mamba-yolo.safetensors').predict('bus.jpg')
+"""
+
+import json
+import mmap
+import struct
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+
+import torch
+
+from ultralytics.utils import yaml_load, yaml_save
+from ultralytics.utils.torch_utils import TORCH_2_1, de_parallel
+
+DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def sidecar(file):
+    """Return the path of the YAML sidecar of tensor file `file`."""
+    return Path(file).with_suffix(".yaml")
+
+
+def save_tensors(file, tensors, metadata=None):
+    """
+    Write `tensors` to `file` in the safetensors format.
+
+    Tensors are stored largest element size first, so every tensor starts at an offset aligned to its element size and
+    can be mapped in place.
+
+    Args:
+        file (str | Path): Output file.
+        tensors (dict): Name to tensor.
+        metadata (dict, optional): String metadata stored in the file header.
+    """
+    names = {v: k for k, v in DTYPES.items()}
+    tensors = {k: v.detach().cpu().contiguous() for k, v in tensors.items()}
+    order = sorted(tensors, key=lambda k: (-tensors[k].element_size(), k))
+    header, offset = {}, 0
+    for k in order:
+        t = tensors[k]
+        n = t.numel() * t.element_size()
+        header[k] = {"dtype": names[t.dtype], "shape": list(t.shape), "data_offsets": [offset, offset + n]}
+        offset += n
+    if metadata:
+        header["__metadata__"] = {k: str(v) for k, v in metadata.items()}
+    header = json.dumps(header, separators=(",", ":")).encode()
+    header += b" " * (-len(header) % 8)  # tensor data starts 8-byte aligned
+    with open(file, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for k in order:
+            if tensors[k].numel():
+                f.write(tensors[k].reshape(-1).view(torch.uint8).numpy().data)
+
+
+def load_tensors(file):
+    """
+    Map the safetensors file `file` into memory.
+
+    The mapping is copy-on-write: the tensors read the file pages directly, which the OS shares between processes
+    mapping the same file, and a tensor modified in place gets private copies of the pages it writes.
+
+    Args:
+        file (str | Path): Safetensors file.
+
+    Returns:
+        (tuple): Name to tensor dict and the header metadata dict.
+    """
+    with open(file, "rb") as f:
+        n = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(n))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    metadata = header.pop("__metadata__", None) or {}
+    tensors = {}
+    for k, v in header.items():
+        dtype, (start, end) = DTYPES[v["dtype"]], v["data_offsets"]
+        if end > start:
+            count = (end - start) // torch.empty(0, dtype=dtype).element_size()
+            t = torch.frombuffer(buffer, dtype=dtype, count=count, offset=8 + n + start)
+        else:
+            t = torch.empty(0, dtype=dtype)
+        tensors[k] = t.reshape(v["shape"])
+    return tensors, metadata
+
+
+def save_weights(model, file, **metadata):
+    """
+    Save `model` as a `.safetensors` tensor file and a YAML sidecar that `load_weights` rebuilds it from.
+
+    Args:
+        model (BaseModel): Unfused model built from a YAML, its tensors are saved in their current dtype. The YAML is
+            saved with the model's class count, which differs from the YAML's after e.g. `reshape_outputs`.
+        file (str | Path): Tensor file, the sidecar is written next to it with a `.yaml` suffix.
+        **metadata (Any): Extra sidecar entries, e.g. train_args=vars(args).
+
+    Returns:
+        (Path): The tensor file.
+    """
+    from ultralytics import __version__
+    from ultralytics.nn.tasks import guess_model_task
+
+    model, file = de_parallel(model), Path(file)
+    if not isinstance(getattr(model, "yaml", None), dict):
+        raise ValueError(f"{type(model).__name__} has no YAML to rebuild it from, save it as a *.pt checkpoint")
+    yaml = deepcopy(model.yaml)
+    if getattr(model, "nc", None):
+        yaml["nc"] = model.nc  # set by the trainer
+    tensors = model.state_dict()
+    if TORCH_2_1:  # the YAML must rebuild the same module tree, which fails for fused models
+        with torch.device("meta"):
+            sd = type(model)(deepcopy(yaml), verbose=False).state_dict()
+        if sd.keys() != tensors.keys() or not matches(sd, tensors):
+            raise ValueError(f"{type(model).__name__} does not match its YAML, save the unfused model")
+    for name, m in model.named_modules():
+        for k, v in vars(m).items():
+            if isinstance(v, torch.Tensor) and v.numel():  # plain tensor attributes, e.g. strides
+                tensors[f"{name}.{k}" if name else k] = v
+    file.parent.mkdir(parents=True, exist_ok=True)
+    save_tensors(file, tensors, {"format": "pt"})
+    meta = {
+        "date": datetime.now().isoformat(),
+        "version": __version__,
+        "class": type(model).__name__,
+        "task": guess_model_task(model),
+        "names": dict(getattr(model, "names", {})),
+        **metadata,
+        "yaml": yaml,
+    }
+    yaml_save(sidecar(file), yaml_safe(meta))
+    return file
+
+
+def matches(sd, tensors):
+    """Return True if `tensors` holds a tensor of the same shape for every entry of state dict `sd`."""
+    return all(k in tensors and tensors[k].shape == v.shape for k, v in sd.items())
+
+
+def yaml_safe(x):
+    """Return `x` with numpy and tensor scalars converted to Python numbers and other non-YAML types to strings."""
+    if isinstance(x, dict):
+        return {k: yaml_safe(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [yaml_safe(v) for v in x]
+    if type(x) in {int, float, str, bool, type(None)}:
+        return x
+    return x.item() if hasattr(x, "item") and getattr(x, "ndim", 0) == 0 else str(x)
+
+
+def load_weights(file):
+    """
+    Rebuild the model saved by `save_weights` from tensor file `file` and its YAML sidecar.
+
+    The model holds the mapped tensors of `file`, see `load_tensors`.
+
+    Args:
+        file (str | Path): Tensor file.
+
+    Returns:
+        (dict): Checkpoint dict in the layout of `torch_safe_load`, the sidecar entries and the model under 'model'.
+    """
+    from ultralytics.nn import tasks
+
+    ckpt = yaml_load(sidecar(file))
+    tensors, _ = load_tensors(file)
+    model = getattr(tasks, ckpt["class"]).from_weights(tensors, ckpt["yaml"], verbose=False)
+    if not matches(model.state_dict(), tensors):  # from_weights falls back to a partial transfer
+        raise ValueError(f"{file} does not match the model YAML of its sidecar {sidecar(file)}")
+    model.names = ckpt.get("names") or model.names
+    model.nc = len(model.names)  # set by the trainer on pickled models
+    return {**ckpt, "model": model}